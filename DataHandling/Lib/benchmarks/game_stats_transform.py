@@ -0,0 +1,95 @@
+import logging
+import argparse
+
+import logging_config
+from db.model.game import SeasonType
+from etl.datasets.game_stats_dataset import GameStatsDataset
+from stand_in.data_generator import SyntheticCfbData
+from timer import Timer
+
+log = logging.getLogger("CfbStats.benchmarks")
+
+
+def flatten_team_stats(team: dict) -> dict:
+    """Converts a CFBD team stats list into the flat fields read by the transform."""
+    team_stat = {k: v for k, v in team.items() if k != "stats"}
+    for stat in team["stats"]:
+        category, value = stat["category"], stat["stat"]
+        if category == "completionAttempts":
+            team_stat[category] = [int(x) for x in value.split("-")]
+        elif value.isdigit():
+            team_stat[category] = int(value)
+        else:
+            team_stat[category] = value
+    return team_stat
+
+
+def get_rows(seasons: int, teams: int) -> list[tuple[int, int, list[int], dict]]:
+    data = SyntheticCfbData(seasons, teams)
+    rows = []
+    for year in data.years:
+        games = {game["id"]: game for game in data.get_games(year)}
+        for game_stat in data.get_game_team_stats(year):
+            game = games[game_stat["id"]]
+            for team in game_stat["teams"]:
+                home_away = team["homeAway"]
+                rows.append(
+                    (
+                        game["id"],
+                        team["teamId"],
+                        game[f"{home_away}LineScores"],
+                        flatten_team_stats(team),
+                    )
+                )
+    return rows
+
+
+def run_benchmark(seasons: int, teams: int, repeats: int):
+    """
+    Times the per row and the batch transform of game team stats on synthetic data and
+    checks that both produce the same entities.
+    """
+    rows = get_rows(seasons, teams)
+    dataset = GameStatsDataset(
+        years=[], classifications=[], weeks=[], season_types=[SeasonType.REGULAR]
+    )
+
+    row_time = batch_time = 0.0
+    for x in range(repeats):
+        timer = Timer("Per row")
+        row_stats = [
+            dataset.create_game_team_stat(
+                {"id": game_id, "teams": [team_stat]}, team_id, line_scores
+            )
+            for game_id, team_id, line_scores, team_stat in rows
+        ]
+        row_time += timer.get_elapsed_time()
+
+        timer = Timer("Batch")
+        batch_stats = []
+        for start in range(0, len(rows), dataset.batch_size):
+            batch_stats.extend(
+                dataset.create_game_team_stats(rows[start : start + dataset.batch_size])
+            )
+        batch_time += timer.get_elapsed_time()
+
+    if [s.model_dump() for s in row_stats] != [s.model_dump() for s in batch_stats]:
+        raise AssertionError("Batch transform output differs from the per row transform")
+
+    log.info(
+        f"Transformed {len(rows)} team stats: per row {row_time / repeats:.3f} seconds, "
+        f"batch {batch_time / repeats:.3f} seconds ({row_time / batch_time:.1f}x speedup)"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the per row and batch game stats transforms"
+    )
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=260)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.seasons, args.teams, args.repeats)
+    logging.shutdown()
@@ -0,0 +1,109 @@
+import logging
+import argparse
+import threading
+
+import logging_config
+from db.db_cleanup import *
+from etl.etls.etl import LoadMode
+from etl.etls.etl_init import EtlInit
+from stand_in.data_generator import SyntheticCfbData
+from stand_in.server import StandInServer
+from timer import Timer
+
+log = logging.getLogger("CfbStats.benchmarks")
+
+
+def stage_synthetic_data(seasons: int, teams: int) -> EtlInit:
+    """
+    Runs the initial ETL on synthetic seasons from the stand-in server and keeps the
+    staged entities in the test staging DB.
+    """
+    data = SyntheticCfbData(seasons, teams)
+    server = StandInServer(data, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        with DbConnection(True) as db_client:
+            cleanup_extraction_collections(db_client)
+            cleanup_staging_collections(db_client)
+            cleanup_production_collections(db_client)
+
+        etl = EtlInit(
+            years=data.years,
+            test_mode=True,
+            clean_staging=False,
+            use_cache=False,
+            incremental=False,
+            cfbd_host=server.host,
+        )
+        etl.run_etl()
+        return etl
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def run_benchmark(seasons: int, teams: int, repeats: int):
+    """
+    Times every load mode on the same staged entities, once into an empty production
+    DB and once more into the production DB the same mode loaded. Production is
+    emptied before every repeat, so the second load only sees documents written by its
+    own mode, e.g. without fingerprints after a merge load. Modes whose load fails are
+    reported as failed.
+    """
+    etl = stage_synthetic_data(seasons, teams)
+
+    results: dict[LoadMode, tuple[float, float]] = {}
+    failed: list[LoadMode] = []
+    with DbConnection(True) as db_client:
+        for mode in LoadMode:
+            etl.load_mode = mode
+            empty_time = loaded_time = 0.0
+            for x in range(repeats):
+                cleanup_production_collections(db_client)
+
+                timer = Timer(f"{mode.value} into empty production")
+                success = etl.run_load(db_client)
+                empty_time += timer.get_elapsed_time()
+
+                timer = Timer(f"{mode.value} into loaded production")
+                success = success and etl.run_load(db_client)
+                loaded_time += timer.get_elapsed_time()
+
+                if not success:
+                    log.error(f"{mode.value}: load failed, not timing this mode")
+                    failed.append(mode)
+                    break
+            else:
+                results[mode] = (empty_time / repeats, loaded_time / repeats)
+
+        cleanup_staging_collections(db_client)
+        cleanup_production_collections(db_client)
+
+    for mode in failed:
+        log.info(f"{mode.value}: failed")
+
+    if LoadMode.entities not in results:
+        return
+
+    base_empty, base_loaded = results[LoadMode.entities]
+    for mode, (empty_time, loaded_time) in results.items():
+        log.info(
+            f"{mode.value}: empty production {empty_time:.2f} seconds "
+            f"({base_empty / empty_time:.1f}x), loaded production {loaded_time:.2f} seconds "
+            f"({base_loaded / loaded_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the load modes from staging to production"
+    )
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=260)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    run_benchmark(args.seasons, args.teams, args.repeats)
+    logging.shutdown()
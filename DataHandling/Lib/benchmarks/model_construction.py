@@ -0,0 +1,109 @@
+import time
+import logging
+import argparse
+
+import logging_config
+from db.model.game import Game
+from db.model.team import Team
+from stand_in.data_generator import SyntheticCfbData
+
+log = logging.getLogger("CfbStats.benchmarks")
+
+
+def get_records(seasons: int, teams: int) -> tuple[list[dict], list[dict]]:
+    data = SyntheticCfbData(seasons, teams)
+    game_records = [
+        {
+            "game_id": game["id"],
+            "season": game["season"],
+            "week": game["week"],
+            "season_type": game["seasonType"],
+            "start_date": game["startDate"],
+            "start_time_tbd": game["startTimeTBD"],
+            "completed": game["completed"],
+            "neutral_site": game["neutralSite"],
+            "conference_game": game["conferenceGame"],
+            "attendance": game["attendance"],
+            "venue_id": game["venueId"],
+            "home_id": game["homeId"],
+            "away_id": game["awayId"],
+            "winning_team_id": game["homeId"],
+            "notes": game["notes"],
+        }
+        for year in data.years
+        for game in data.get_games(year)
+    ]
+    team_records = [
+        {
+            "team_id": team["id"],
+            "year": year,
+            "school": team["school"],
+            "conference_id": 1,
+            "classification": team["classification"],
+            "division": team["division"],
+            "venue_id": team["location"]["id"],
+        }
+        for year in data.years
+        for team in data.get_teams(year)
+    ]
+    return game_records, team_records
+
+
+def time_per_entity(func, count: int, repeats: int) -> float:
+    start_time = time.perf_counter()
+    for x in range(repeats):
+        func()
+    return (time.perf_counter() - start_time) / (repeats * count) * 1e6
+
+
+def run_benchmark(seasons: int, teams: int, repeats: int):
+    """
+    Compares the per entity cost of constructing, validating again and assigning
+    fields one entity at a time with validating a batch once, and with constructing
+    trusted entities from documents.
+    """
+    game_records, team_records = get_records(seasons, teams)
+
+    def construct_games():
+        for record in game_records:
+            game = Game(**record)
+            Game.model_validate(game)
+
+    def construct_teams():
+        for record in team_records:
+            team = Team(**{**record, "venue_id": None})
+            team.venue_id = record["venue_id"]
+            Team.model_validate(team)
+
+    game_docs = [game.model_dump() for game in Game.validate_many(game_records)]
+    team_docs = [team.model_dump() for team in Team.validate_many(team_records)]
+
+    for name, model, records, docs, construct in (
+        ("Game", Game, game_records, game_docs, construct_games),
+        ("Team", Team, team_records, team_docs, construct_teams),
+    ):
+        before = time_per_entity(construct, len(records), repeats)
+        batch = time_per_entity(
+            lambda: model.validate_many(records), len(records), repeats
+        )
+        trusted = time_per_entity(
+            lambda: [model.from_trusted(doc) for doc in docs], len(docs), repeats
+        )
+        log.info(
+            f"{name} ({len(records)} entities): per entity {before:.2f} us, "
+            f"batch {batch:.2f} us ({before / batch:.1f}x), "
+            f"trusted {trusted:.2f} us ({before / trusted:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compares the construction cost of entity models"
+    )
+    parser.add_argument("--seasons", type=int, default=1)
+    parser.add_argument("--teams", type=int, default=260)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    run_benchmark(args.seasons, args.teams, args.repeats)
+    logging.shutdown()
@@ -2,6 +2,7 @@ from pydantic_mongo import AbstractRepository
 from pymongo.collection import Collection
 
 from db.db_connection import *
+from db.db_index_setup import drop_ephemeral_indexes
 from db.model.cfb_model import CfbBaseModel
 
 log = logging.getLogger("CfbStats.db")
@@ -23,41 +24,64 @@ def cleanup_collection(coll: Collection = None, repo: AbstractRepository = None)
 
 
 def cleanup_extraction_collections(db_client: DbConnection = DbConnection(), *colls):
-    """Cleans up extraction collections. If no collections are given, all extraction collections will be cleaned up."""
+    """
+    Cleans up extraction collections and drops their ephemeral indexes. If no collections
+    are given, all extraction collections will be cleaned up except for the manifest, which
+    is kept between runs.
+    """
     if len(colls) != 0:
         colls_to_cleanup = colls
     else:
-        colls_to_cleanup = set(ExtractionCollections)
+        colls_to_cleanup = set(ExtractionCollections) - {ExtractionCollections.manifest}
 
     for coll in colls_to_cleanup:
         if not isinstance(coll, ExtractionCollections):
             raise Exception("Given argument is not an extraction collection")
 
-        cleanup_collection(
-            coll=db_client.get_cfb_collection(Databases.extraction, coll)
-        )
+        extr_coll = db_client.get_cfb_collection(Databases.extraction, coll)
+        cleanup_collection(coll=extr_coll)
+        drop_ephemeral_indexes(extr_coll)
 
 
 def cleanup_staging_collections(db_client: DbConnection = DbConnection(), *models):
-    """Cleans up staging collections. If no models are given, all staging collections will be cleaned up."""
+    """
+    Cleans up staging collections and drops their ephemeral indexes. If no models are given,
+    all staging collections will be cleaned up along with the load checkpoints, which only
+    apply to the staged data.
+    """
     if len(models) != 0:
         models_to_cleanup = models
     else:
         models_to_cleanup = cfb_models
+        cleanup_collection(
+            coll=db_client.get_cfb_database(Databases.staging)[
+                load_checkpoint_collection
+            ]
+        )
 
     for model in models_to_cleanup:
         if not issubclass(model, CfbBaseModel):
             raise Exception("Given argument is not an entity model")
 
-        cleanup_collection(coll=db_client.get_cfb_collection(Databases.staging, model))
+        stage_coll = db_client.get_cfb_collection(Databases.staging, model)
+        cleanup_collection(coll=stage_coll)
+        drop_ephemeral_indexes(stage_coll)
 
 
 def cleanup_production_collections(db_client: DbConnection = DbConnection(), *models):
-    """Cleans up production collections. If no models are given, all production collections will be cleaned up."""
+    """
+    Cleans up production collections. If no models are given, all production collections
+    will be cleaned up along with the extraction manifest, so the next run extracts everything.
+    """
     if len(models) != 0:
         models_to_cleanup = models
     else:
         models_to_cleanup = cfb_models
+        cleanup_collection(
+            coll=db_client.get_cfb_collection(
+                Databases.extraction, ExtractionCollections.manifest
+            )
+        )
 
     for model in models_to_cleanup:
         if not issubclass(model, CfbBaseModel):
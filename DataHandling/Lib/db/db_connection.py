@@ -29,10 +29,14 @@ class ExtractionCollections(Enum):
     game_team_stats = "game_team_stats"
     team = "team"
     venue = "venue"
+    manifest = "manifest"
 
 
 cfb_models = {Conference, Game, GameTeamStats, Team, TeamExt, Venue}
 
+# Staging collection holding the progress of chunked loads
+load_checkpoint_collection = "load_checkpoint"
+
 
 class DbConnection(MongoClient):
     def __init__(self, test_mode: bool = False):
@@ -1,3 +1,4 @@
+import time
 import logging
 from typing import Type
 from pymongo.collection import Collection
@@ -11,6 +12,24 @@ from db.model.venue import Venue
 
 log = logging.getLogger("CfbStats.db.scripts")
 
+# Prefix of the indexes that only exist during an ETL run
+ephemeral_prefix = "etl_"
+
+# Lookups on the extraction and staging collections during an ETL run
+extraction_indexes: dict[ExtractionCollections, list[list[str]]] = {
+    ExtractionCollections.conference: [["name", "classification"], ["id"]],
+    ExtractionCollections.game: [["id"]],
+    ExtractionCollections.venue: [["id"]],
+}
+staging_indexes: dict[Type[CfbBaseModel], list[list[str]]] = {
+    Conference: [["name"], ["conference_id"]],
+    Game: [["game_id"]],
+    GameTeamStats: [["game_id", "team_id"]],
+    Team: [["year", "team_id"], ["year", "school"]],
+    TeamExt: [["team_id", "year"]],
+    Venue: [["venue_id"]],
+}
+
 
 def setup_indexes(db_client: DbConnection = DbConnection()):
     log.info("Starting index setup")
@@ -57,3 +76,148 @@ def setup_indexes(db_client: DbConnection = DbConnection()):
     log.debug("Created 1 indexes for collection: Venue")
 
     log.info("Index setup completed")
+
+
+class EphemeralIndexes:
+    """
+    Indexes on the extraction or staging collections that only live for a single ETL run.
+    They are created once the collections have been written, and dropped again by
+    'cleanup_extraction_collections' and 'cleanup_staging_collections'.
+
+    The report compares the build time with an estimate of the lookup time saved, which
+    is the number of index accesses times the difference between a collection scan and
+    an index probe.
+    """
+
+    def __init__(self, db_client: DbConnection, db: Databases, unique_keys: bool = False):
+        """
+        With 'unique_keys', the staging indexes on the 'model_keys' of a model are unique,
+        as '$merge' requires for merging on them.
+        """
+        if db is Databases.extraction:
+            self.indexes = extraction_indexes
+        elif db is Databases.staging:
+            self.indexes = staging_indexes
+        else:
+            raise Exception("Ephemeral indexes are only used in extraction and staging")
+        if unique_keys and db is not Databases.staging:
+            raise Exception("Only staging indexes can be unique on the model keys")
+
+        self.db_client = db_client
+        self.db = db
+        self.unique_keys = unique_keys
+        self.build_time = 0.0
+
+    def create(self):
+        start_time = time.perf_counter()
+        for model, indexes in self.indexes.items():
+            coll = self.db_client.get_cfb_collection(self.db, model)
+            existing = coll.index_information()
+            for fields in indexes:
+                unique = self.unique_keys and set(fields) == set(model.model_keys())
+
+                # Indexes kept from a run in another mode may differ in uniqueness,
+                # which conflicts with the same fields
+                for name, info in existing.items():
+                    if (
+                        name.startswith(ephemeral_prefix)
+                        and [field for field, _ in info["key"]] == fields
+                        and info.get("unique", False) != unique
+                    ):
+                        coll.drop_index(name)
+                        log.debug(f"Dropped ephemeral index {name} of collection {coll.name}")
+
+                coll.create_index(
+                    [(field, 1) for field in fields],
+                    name=get_ephemeral_index_name(fields),
+                    unique=unique,
+                )
+        self.build_time += time.perf_counter() - start_time
+
+        log.debug(
+            f"Created {sum(len(i) for i in self.indexes.values())} ephemeral indexes in {self.db.name} in {self.build_time:.2f} seconds"
+        )
+
+    def log_report(self):
+        """
+        Logs the report. It runs during cleanups after failures too, so errors only
+        skip the report.
+        """
+        lookups = 0
+        saved_time = 0.0
+        try:
+            for model, indexes in self.indexes.items():
+                coll = self.db_client.get_cfb_collection(self.db, model)
+                accesses = get_index_accesses(coll)
+                for fields in indexes:
+                    name = get_ephemeral_index_name(fields)
+                    ops = accesses.get(name, 0)
+                    if ops == 0:
+                        continue
+
+                    lookups += ops
+                    saved_time += ops * get_probe_savings(coll, fields, name)
+        except Exception as e:
+            log.warning(f"Failed to report the ephemeral {self.db.name} indexes: {e}")
+            return
+
+        log.info(
+            f"Ephemeral {self.db.name} indexes: built in {self.build_time:.2f} seconds, "
+            f"{lookups} lookups saved an estimated {saved_time:.2f} seconds"
+        )
+
+
+def get_ephemeral_index_name(fields: list[str]) -> str:
+    return ephemeral_prefix + "_".join(fields)
+
+
+def drop_ephemeral_indexes(coll: Collection):
+    for name in coll.index_information():
+        if name.startswith(ephemeral_prefix):
+            coll.drop_index(name)
+            log.debug(f"Dropped ephemeral index {name} of collection {coll.name}")
+
+
+def ensure_unique_index(coll: Collection, fields: list[str]):
+    """
+    Creates a unique index on the fields unless the collection has one on the same fields
+    in any order, like '$merge' requires for its 'on' fields. Raises if the documents of
+    the collection are not unique on the fields.
+    """
+    for info in coll.index_information().values():
+        if info.get("unique") and {field for field, _ in info["key"]} == set(fields):
+            return
+
+    coll.create_index([(field, 1) for field in fields], unique=True)
+    log.info(f"Created unique index on {fields} of collection {coll.name}")
+
+
+def get_index_accesses(coll: Collection) -> dict[str, int]:
+    """Returns the number of operations that used each index since it was created."""
+    return {
+        stats["name"]: stats["accesses"]["ops"]
+        for stats in coll.aggregate([{"$indexStats": {}}])
+    }
+
+
+def get_probe_savings(
+    coll: Collection, fields: list[str], name: str, repeats: int = 3
+) -> float:
+    """
+    Measures how much faster a lookup of a document in the middle of the collection is
+    with the index than with a collection scan.
+    """
+    count = coll.estimated_document_count()
+    sample = next(coll.find({}).skip(count // 2).limit(1), None)
+    if sample is None:
+        return 0.0
+
+    query = {field: sample.get(field) for field in fields}
+
+    def probe(hint) -> float:
+        start_time = time.perf_counter()
+        for x in range(repeats):
+            next(coll.find(query, {"_id": 1}).hint(hint).limit(1), None)
+        return (time.perf_counter() - start_time) / repeats
+
+    return max(probe([("$natural", 1)]) - probe(name), 0.0)
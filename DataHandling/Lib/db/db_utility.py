@@ -1,9 +1,16 @@
+import time
+import hashlib
+import threading
 from typing import Optional, Union
 
+import bson
 from db import db_connection
 from db.db_connection import *
 from db.model.cfb_model import CfbBaseModel
 from pymongo import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.client_session import ClientSession
+
+log = logging.getLogger("CfbStats.db")
 
 _WriteOp = Union[
     InsertOne,
@@ -14,6 +21,221 @@ _WriteOp = Union[
     UpdateMany,
 ]
 
+max_buffer_operations = 1000
+max_buffer_bytes = 16 * 1024 * 1024
+
+# Field of production documents holding the fingerprint of their content
+fingerprint_field = "fingerprint"
+
+
+class PendingEntityRegistry:
+    """
+    Keys of the entities written through a write buffer, by namespace, so pending
+    entities can be found and duplicates rejected without scanning the operations.
+
+    Documents are only kept for entities registered with lookup keys.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entities: dict[tuple[str, tuple], Optional[dict]] = {}
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def get_key(self, namespace: str, query: dict) -> tuple[str, tuple]:
+        return (namespace, tuple(sorted(query.items())))
+
+    def register(
+        self,
+        namespace: str,
+        key: dict,
+        doc: dict,
+        lookup_keys: tuple[dict, ...] = (),
+    ) -> bool:
+        """
+        Registers an entity under its model key and any 'lookup_keys'. Returns False if
+        an entity with the same model key is already registered.
+        """
+        entity_key = self.get_key(namespace, key)
+        with self.lock:
+            if entity_key in self.entities:
+                return False
+
+            if len(lookup_keys) == 0:
+                self.entities[entity_key] = None
+                return True
+
+            self.entities[entity_key] = doc
+            for lookup_key in lookup_keys:
+                self.entities.setdefault(self.get_key(namespace, lookup_key), doc)
+            return True
+
+    def get(self, namespace: str, query: dict) -> Optional[dict]:
+        """Returns the document of a pending entity registered under the query."""
+        return self.entities.get(self.get_key(namespace, query))
+
+
+class WriteBuffer:
+    """
+    Collects write operations and sends them with a bulk write whenever the buffer
+    holds 'max_operations' operations or 'max_bytes' of documents. Datasets can use it
+    in place of an operations list, so only one flush worth of documents is held in
+    memory at a time.
+
+    Leaving a 'with' block flushes the buffer unless an exception is raised or the
+    buffer was discarded, e.g. because the operations belong to a failed dataset.
+    """
+
+    def __init__(
+        self,
+        db_client: DbConnection,
+        name: str = "Write buffer",
+        session: Optional[ClientSession] = None,
+        max_operations: int = max_buffer_operations,
+        max_bytes: int = max_buffer_bytes,
+    ):
+        self.db_client = db_client
+        self.name = name
+        self.session = session
+        self.max_operations = max_operations
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pending = PendingEntityRegistry()
+        self.discarded = False
+
+        self.operations: list[_WriteOp] = []
+        self.size = 0
+        self.flushes = 0
+        self.written_operations = 0
+        self.written_bytes = 0
+        self.write_time = 0.0
+
+    def __len__(self) -> int:
+        return len(self.operations)
+
+    def __iter__(self):
+        """Iterates over the operations that have not been written yet."""
+        with self.lock:
+            return iter(list(self.operations))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None and not self.discarded:
+            self.flush()
+
+    def discard(self):
+        """Drops the buffered operations and skips the flush when leaving a 'with' block."""
+        with self.lock:
+            operations, size = self.take_operations()
+            self.discarded = True
+        if len(operations) > 0:
+            log.warning(f"{self.name}: discarded {len(operations)} unwritten operations")
+
+    def append(self, op: _WriteOp):
+        size = get_operation_size(op)
+        with self.lock:
+            self.operations.append(op)
+            self.size += size
+            if (
+                len(self.operations) < self.max_operations
+                and self.size < self.max_bytes
+            ):
+                return
+            operations, size = self.take_operations()
+
+        self.write(operations, size)
+
+    def extend(self, ops: list[_WriteOp]):
+        for op in ops:
+            self.append(op)
+
+    def append_entity(
+        self, op: _WriteOp, entity: CfbBaseModel, *lookup_keys: dict
+    ) -> bool:
+        """
+        Appends the write operation of an entity unless an entity with the same model key
+        has already been written through this buffer. The pending entity can be found
+        with 'pending.get' by any of the 'lookup_keys'.
+        """
+        return self.append_keyed(op, entity.get_model_query(), *lookup_keys)
+
+    def append_keyed(self, op: _WriteOp, key: dict, *lookup_keys: dict) -> bool:
+        """Like 'append_entity', for operations whose entity is only known by its key."""
+        if not self.pending.register(op._namespace, key, op._doc, lookup_keys):
+            log.debug(f"{self.name}: skipped duplicate {key}")
+            return False
+
+        self.append(op)
+        return True
+
+    def extend_entities(
+        self, ops: list[_WriteOp], entities: tuple[CfbBaseModel, ...]
+    ) -> int:
+        """Appends the write operations of entities and returns the number appended."""
+        return sum(self.append_entity(op, entity) for op, entity in zip(ops, entities))
+
+    def flush(self):
+        """Writes all buffered operations."""
+        with self.lock:
+            operations, size = self.take_operations()
+        self.write(operations, size)
+
+    def take_operations(self) -> tuple[list[_WriteOp], int]:
+        operations, size = self.operations, self.size
+        self.operations = []
+        self.size = 0
+        return operations, size
+
+    def write(self, operations: list[_WriteOp], size: int):
+        if len(operations) == 0:
+            return
+
+        start_time = time.perf_counter()
+        self.db_client.bulk_write(operations, session=self.session)
+        elapsed_time = time.perf_counter() - start_time
+
+        with self.lock:
+            self.flushes += 1
+            self.written_operations += len(operations)
+            self.written_bytes += size
+            self.write_time += elapsed_time
+
+        log.debug(
+            f"{self.name}: wrote {len(operations)} operations ({size / (1024 * 1024):.2f} MB) "
+            f"in {elapsed_time:.2f} seconds ({len(operations) / max(elapsed_time, 1e-6):.0f} ops/s)"
+        )
+
+    def log_stats(self):
+        log.info(
+            f"{self.name}: wrote {self.written_operations} operations "
+            f"({self.written_bytes / (1024 * 1024):.1f} MB) in {self.flushes} bulk writes "
+            f"taking {self.write_time:.2f} seconds"
+        )
+
+
+def get_operation_size(op: _WriteOp) -> int:
+    """Returns the encoded size of the document carried by a write operation."""
+    doc = getattr(op, "_doc", None)
+    if doc is None:
+        return 0
+    return len(bson.encode(doc))
+
+
+def get_fingerprint(doc: dict) -> bytes:
+    """
+    Returns a hash of the fields of an entity document, ignoring its id and fingerprint,
+    so unchanged entities are recognized without comparing their fields.
+    """
+    content = {
+        key: value
+        for key, value in sorted(doc.items())
+        if key not in ("_id", "id", fingerprint_field)
+    }
+    return hashlib.blake2b(bson.encode(content), digest_size=16).digest()
+
 
 def insert_many_operations(
     db_client: DbConnection,
@@ -55,7 +277,7 @@ def insert_one_operation(
             raise ValueError("Entity or model do not match extraction types")
 
     else:
-        if model is not None and isinstance(ExtractionCollections):
+        if model is not None and isinstance(model, ExtractionCollections):
             raise ValueError("Model must be instance of CfbBaseModel")
 
     if isinstance(entity, dict) and model is None:
@@ -100,17 +322,6 @@ def insert_one_operation(
         return InsertOne(namespace=namespace, document=document)
 
 
-def get_insert_operation_from_list(
-    operations: list[_WriteOp], query: dict, namespace: str
-) -> Optional[dict]:
-
-    ops = [o for o in operations if o._namespace == namespace]
-    for op in ops:
-        doc = op._doc
-        if all(doc[x] == query[x] for x in query):
-            return doc
-
-
 def get_random_entity(
     db_client: DbConnection,
     db: Databases = Databases.production,
@@ -1,6 +1,7 @@
-from typing import Optional, Type
+from functools import cache
+from typing import Optional, Self, Type
 from abc import ABC, abstractmethod
-from pydantic import BaseModel, Field, ConfigDict
+from pydantic import BaseModel, Field, ConfigDict, TypeAdapter
 from pydantic_mongo import AbstractRepository, PydanticObjectId
 
 
@@ -23,6 +24,29 @@ class CfbBaseModel(ABC, BaseModel):
     def get_model_query(self) -> dict:
         pass
 
+    @staticmethod
+    @abstractmethod
+    def model_keys() -> tuple[str, ...]:
+        """Returns the fields of 'get_model_query', which identify an entity."""
+        pass
+
+    def get_model_key(self) -> tuple:
+        """Returns the values of the 'model_keys' fields, for hashing entities."""
+        return tuple(getattr(self, key) for key in self.model_keys())
+
+    @classmethod
+    def validate_many(cls, records: list[dict]) -> list[Self]:
+        """Validates a batch of records with a single call, once per record."""
+        return get_list_adapter(cls).validate_python(records)
+
+    @classmethod
+    def from_trusted(cls, doc: dict) -> Self:
+        """
+        Creates an entity without validation, for documents written from validated
+        entities, like the staging and production collections.
+        """
+        return cls.model_construct(**doc)
+
     @staticmethod
     @abstractmethod
     def model_id() -> str:
@@ -32,3 +56,8 @@ class CfbBaseModel(ABC, BaseModel):
     @abstractmethod
     def model_repository() -> Type[AbstractRepository]:
         pass
+
+
+@cache
+def get_list_adapter(model: Type[CfbBaseModel]) -> TypeAdapter:
+    return TypeAdapter(list[model])
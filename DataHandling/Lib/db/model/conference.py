@@ -16,6 +16,11 @@ class Conference(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"conference_id": self.conference_id}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("conference_id",)
+
     @override
     @staticmethod
     def model_id() -> str:
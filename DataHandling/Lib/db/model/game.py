@@ -19,6 +19,15 @@ class SeasonType(Enum):
     POSTSEASON = "postseason"
 
 
+def current_season() -> int:
+    """
+    Returns the year of the latest season that may still change. A season's bowl games
+    run into January of the following year, so it is not complete until February.
+    """
+    today = datetime.now()
+    return today.year if today.month >= 2 else today.year - 1
+
+
 class Game(CfbBaseModel):
 
     game_id: StrictInt = Field(...)
@@ -41,6 +50,11 @@ class Game(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"game_id": self.game_id}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("game_id",)
+
     @override
     @staticmethod
     def model_id() -> str:
@@ -119,6 +133,11 @@ class GameTeamStats(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"game_id": self.game_id, "team_id": self.team_id}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("game_id", "team_id")
+
     @override
     @staticmethod
     def model_id() -> str:
@@ -18,6 +18,11 @@ class Team(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"team_id": self.team_id, "year": self.year}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("team_id", "year")
+
     @override
     @staticmethod
     def model_id() -> str:
@@ -53,6 +58,11 @@ class TeamExt(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"team_id": self.team_id, "year": self.year}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("team_id", "year")
+
     @override
     @staticmethod
     def model_id() -> str:
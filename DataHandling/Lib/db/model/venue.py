@@ -25,6 +25,11 @@ class Venue(CfbBaseModel):
     def get_model_query(self) -> dict:
         return {"venue_id": self.venue_id}
 
+    @override
+    @staticmethod
+    def model_keys() -> tuple[str, ...]:
+        return ("venue_id",)
+
     @override
     @staticmethod
     def model_id() -> str:
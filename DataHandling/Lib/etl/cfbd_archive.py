@@ -0,0 +1,92 @@
+import gzip
+import json
+import logging
+import threading
+from enum import Enum
+
+from cfbd import rest
+from cfbd.exceptions import ApiException
+
+from etl.cfbd_cache import stored_response
+
+log = logging.getLogger("CfbStats.etl")
+
+
+class CfbdMode(Enum):
+    live = "live"
+    record = "record"
+    replay = "replay"
+
+
+class ResponseRecorder:
+    """
+    Appends every CFBD response to a gzip compressed JSON lines archive.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.count = 0
+        self.file = gzip.open(path, "at", encoding="utf-8")
+        log.info(f"Recording CFBD responses to {path}")
+
+    def record(self, method: str, url: str, response: rest.RESTResponse):
+        content_type = response.getheader("content-type")
+        entry = {
+            "method": method,
+            "url": url,
+            "status": response.status,
+            "headers": {"content-type": content_type} if content_type else {},
+            "body": response.data.decode("utf-8"),
+        }
+
+        with self.lock:
+            self.file.write(json.dumps(entry) + "\n")
+            self.count += 1
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            self.file.close()
+        log.info(f"Recorded {self.count} CFBD responses to {self.path}")
+
+
+class ResponseArchive:
+    """
+    Serves recorded CFBD responses. Requests repeated in the archive are answered in
+    recording order, and the last recorded response is reused after that.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        self.responses: dict[tuple[str, str], list[dict]] = {}
+        self.served: dict[tuple[str, str], int] = {}
+
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                key = (entry["method"], entry["url"])
+                self.responses.setdefault(key, []).append(entry)
+
+        log.info(
+            f"Replaying {sum(len(r) for r in self.responses.values())} CFBD responses from {path}"
+        )
+
+    def get(self, method: str, url: str) -> rest.RESTResponse:
+        key = (method, url)
+        entries = self.responses.get(key)
+        if entries is None:
+            raise ApiException(
+                status=404, reason=f"{method} {url} is not in the replay archive"
+            )
+
+        with self.lock:
+            index = self.served.get(key, 0)
+            self.served[key] = index + 1
+
+        entry = entries[min(index, len(entries) - 1)]
+        return stored_response(
+            entry["status"], entry["headers"], entry["body"].encode("utf-8")
+        )
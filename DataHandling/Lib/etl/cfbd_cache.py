@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import Optional
+from urllib.parse import urlparse, parse_qs
+
+import urllib3
+from cfbd import rest
+
+from db.model.game import current_season
+
+log = logging.getLogger("CfbStats.etl")
+
+cache_dir = "DataHandling/Cache"
+max_cache_bytes = 500 * 1024 * 1024
+
+# Time to live in seconds for responses of the current season, by endpoint.
+# Responses for completed seasons never expire.
+endpoint_ttls = {
+    "/games": 15 * 60,
+    "/games/teams": 15 * 60,
+    "/teams": 24 * 60 * 60,
+    "/teams/fbs": 24 * 60 * 60,
+    "/conferences": 7 * 24 * 60 * 60,
+    "/venues": 7 * 24 * 60 * 60,
+}
+default_ttl = 60 * 60
+
+
+def stored_response(status: int, headers: dict, body: bytes) -> rest.RESTResponse:
+    """
+    Builds a response the CFBD client can deserialize from stored response data.
+    """
+    return rest.RESTResponse(
+        urllib3.HTTPResponse(
+            body=body, headers=headers, status=status, preload_content=True
+        )
+    )
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of CFBD responses keyed by request method and URL. Entries are
+    evicted least recently used first once the cache grows past 'max_bytes'.
+    """
+
+    def __init__(self, directory: str = cache_dir, max_bytes: int = max_cache_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.directory, exist_ok=True)
+        self.size = sum(
+            os.path.getsize(os.path.join(self.directory, f))
+            for f in os.listdir(self.directory)
+            if f.endswith(".json")
+        )
+
+    def get(self, method: str, url: str) -> Optional[rest.RESTResponse]:
+        """Returns the cached response for a request, or None if it is missing or expired."""
+        path = self.get_path(method, url)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            with self.lock:
+                self.misses += 1
+            return None
+
+        ttl = self.get_ttl(url)
+        if ttl is not None and time.time() - entry["fetched_at"] > ttl:
+            log.debug(f"Cache entry expired for {url}")
+            with self.lock:
+                self.misses += 1
+            return None
+
+        # Mark as recently used for eviction
+        os.utime(path)
+        with self.lock:
+            self.hits += 1
+
+        return stored_response(
+            entry["status"], entry["headers"], entry["body"].encode("utf-8")
+        )
+
+    def put(self, method: str, url: str, response: rest.RESTResponse):
+        """Stores a successful response."""
+        if not 200 <= response.status <= 299:
+            return
+
+        content_type = response.getheader("content-type")
+        entry = {
+            "method": method,
+            "url": url,
+            "status": response.status,
+            "headers": {"content-type": content_type} if content_type else {},
+            "body": response.data.decode("utf-8"),
+            "fetched_at": time.time(),
+        }
+
+        path = self.get_path(method, url)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+
+        with self.lock:
+            if os.path.exists(path):
+                self.size -= os.path.getsize(path)
+            os.replace(temp_path, path)
+            self.size += os.path.getsize(path)
+
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache is under its size limit."""
+        entries = []
+        for f in os.listdir(self.directory):
+            if not f.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, f)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        count = 0
+        for mtime, size, path in sorted(entries):
+            if self.size <= self.max_bytes * 0.9:
+                break
+            os.remove(path)
+            self.size -= size
+            count += 1
+
+        log.debug(f"Evicted {count} entries from the response cache")
+
+    def get_path(self, method: str, url: str) -> str:
+        key = hashlib.sha256(f"{method} {url}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get_ttl(self, url: str) -> Optional[float]:
+        """
+        Returns the time to live for a URL in seconds, or None if it never expires.
+        """
+        parsed_url = urlparse(url)
+        params = parse_qs(parsed_url.query)
+
+        year = params.get("year")
+        if year is not None and int(year[0]) < current_season():
+            return None
+
+        return endpoint_ttls.get(parsed_url.path, default_ttl)
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        if total == 0:
+            return
+        log.info(
+            f"Response cache: {self.hits}/{total} hits ({self.hits / total:.0%}), "
+            f"{self.size / (1024 * 1024):.1f} MB on disk"
+        )
@@ -1,48 +1,373 @@
 import time
+import random
 import logging
-from typing import Callable
+import threading
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 import config
 import cfbd
+import urllib3
 from cfbd.api_client import ApiClient
+from cfbd.exceptions import ApiException
+
+from etl.cfbd_archive import CfbdMode, ResponseArchive, ResponseRecorder
+from etl.cfbd_cache import ResponseCache
 
 log = logging.getLogger("CfbStats.etl")
 
+cfbd_host = "https://api.collegefootballdata.com"
+
 
 class CfbdConnection(ApiClient):
 
-    def __init__(self):
+    def __init__(
+        self,
+        use_cache: bool = True,
+        mode: CfbdMode = CfbdMode.live,
+        archive: Optional[str] = None,
+        host: str = cfbd_host,
+    ):
         # Configure Bearer authorization: apiKey
-        configuration = cfbd.Configuration(
-            host="https://api.collegefootballdata.com", access_token=config.cfbd_token
-        )
+        configuration = cfbd.Configuration(host=host, access_token=config.cfbd_token)
 
         super().__init__(configuration)
 
+        if mode is not CfbdMode.live and archive is None:
+            raise ValueError(f"An archive path is required in {mode.value} mode")
+
+        self.mode = mode
+        self.cache = ResponseCache() if use_cache and mode is not CfbdMode.replay else None
+        self.recorder = ResponseRecorder(archive) if mode is CfbdMode.record else None
+        self.archive = ResponseArchive(archive) if mode is CfbdMode.replay else None
+
     def __del__(self):
         log.debug("CFBD API client closed")
+        self.close()
+
+    def close(self):
         super().close()
+        recorder = getattr(self, "recorder", None)
+        if recorder is not None:
+            recorder.close()
+
+    def request(
+        self,
+        method,
+        url,
+        query_params=None,
+        headers=None,
+        post_params=None,
+        body=None,
+        _preload_content=True,
+        _request_timeout=None,
+    ):
+        """
+        Sends every HTTP request of the generated API classes. Responses are served from
+        the replay archive in replay mode, otherwise GET responses are served from the
+        response cache when possible. In record mode every response is archived.
+        """
+        if self.archive is not None:
+            return self.archive.get(method, url)
+
+        use_cache = self.cache is not None and method == "GET" and _preload_content
+        response = self.cache.get(method, url) if use_cache else None
+
+        if response is None:
+            rate_limiter.acquire()
+            response = super().request(
+                method,
+                url,
+                query_params=query_params,
+                headers=headers,
+                post_params=post_params,
+                body=body,
+                _preload_content=_preload_content,
+                _request_timeout=_request_timeout,
+            )
 
+            if use_cache:
+                self.cache.put(method, url, response)
 
-retries = 3
-wait_time = 5
+        if self.recorder is not None and _preload_content:
+            self.recorder.record(method, url, response)
 
+        return response
 
-def api_call(lamb: Callable) -> list | None:
+
+max_workers = 4
+requests_per_second = 5.0
+
+
+class RateLimiter:
     """
-    Executes a CFDB API call from a lambda. Handles exceptions with
-    a set number of retries and a timeout. This is due to the API
-    occasionally returning exceptions for no reason.
+    Token bucket shared by every API request. Tokens refill at 'rate' per second up to
+    'capacity', and each request sent over the network consumes one token.
     """
-    for x in range(1, retries + 1):
+
+    def __init__(self, rate: float, capacity: int = 1):
+        if rate <= 0:
+            raise ValueError("Rate must be greater than 0")
+
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self.tokens = float(self.capacity)
+        self.last_refill = time.perf_counter()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self.lock:
+                now = time.perf_counter()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.last_refill) * self.rate
+                )
+                self.last_refill = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                wait = (1 - self.tokens) / self.rate
+
+            time.sleep(wait)
+
+
+rate_limiter = RateLimiter(requests_per_second, capacity=max_workers)
+
+
+class RetryPolicy:
+    """
+    Decides whether a failed API call is retried and how long to wait before the next
+    attempt. Delays grow exponentially with jitter, unless the API sends a Retry-After.
+    """
+
+    retryable_statuses = {0, 408, 429, 500, 502, 503, 504}
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        jitter: float = 0.5,
+    ):
+        if max_attempts < 1:
+            raise ValueError("At least one attempt must be allowed")
+
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+
+    def is_retryable(self, e: Exception) -> bool:
+        """Transient server and network errors are retryable, everything else is fatal."""
+        if isinstance(e, ApiException):
+            return e.status in self.retryable_statuses
+        return isinstance(e, (urllib3.exceptions.HTTPError, OSError))
+
+    def get_delay(self, attempt: int, e: Exception) -> float:
+        """Returns the number of seconds to wait after the given failed attempt."""
+        retry_after = self.get_retry_after(e)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+
+        delay = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+    def get_retry_after(self, e: Exception) -> float | None:
+        if not isinstance(e, ApiException) or e.headers is None:
+            return None
+
+        value = e.headers.get("Retry-After")
+        if value is None:
+            return None
+
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+
+        try:
+            retry_date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max((retry_date - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class CircuitBreaker:
+    """
+    Stops calling the API after too many consecutive failures. Once 'reset_timeout'
+    seconds have passed, a single trial call is let through to probe the API again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self.lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+
+            if time.perf_counter() - self.opened_at < self.reset_timeout:
+                return False
+
+            # Half open: only one trial call at a time
+            if self.trial_running:
+                return False
+            self.trial_running = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            if self.opened_at is not None:
+                log.info("API circuit breaker closed")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.trial_running = False
+
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    log.error(
+                        f"API circuit breaker opened after {self.failures} consecutive failures"
+                    )
+                self.opened_at = time.perf_counter()
+
+
+class ApiStats:
+    """Collects call, retry and latency statistics per API endpoint."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints: dict[str, dict[str, float]] = {}
+
+    def reset(self):
+        with self.lock:
+            self.endpoints = {}
+
+    def record(self, endpoint: str, **values: float):
+        with self.lock:
+            stats = self.endpoints.setdefault(
+                endpoint,
+                {"calls": 0, "failures": 0, "retries": 0, "sleep": 0.0, "latency": 0.0},
+            )
+            for key, value in values.items():
+                stats[key] += value
+
+    def log_stats(self):
+        with self.lock:
+            for endpoint, stats in sorted(self.endpoints.items()):
+                log.info(
+                    f"API {endpoint}: {stats['calls']:.0f} calls, "
+                    f"{stats['failures']:.0f} failed, {stats['retries']:.0f} retries, "
+                    f"{stats['sleep']:.1f}s sleeping, "
+                    f"{stats['latency']:.1f}s waiting on responses"
+                )
+
+
+retry_policy = RetryPolicy()
+circuit_breaker = CircuitBreaker()
+api_stats = ApiStats()
+
+
+def api_call(lamb: Callable, endpoint: str = "unknown") -> list | None:
+    """
+    Executes a CFDB API call from a lambda. Transient errors are retried according to
+    the retry policy, since the API occasionally returns exceptions for no reason.
+    Returns None if the call failed.
+    """
+    return timed_api_call(lamb, endpoint)[0]
+
+
+def timed_api_call(
+    lamb: Callable, endpoint: str = "unknown"
+) -> tuple[list | None, float]:
+    """
+    Same as api_call, but also returns the latency of the successful request in seconds.
+    """
+    api_stats.record(endpoint, calls=1)
+
+    for attempt in range(1, retry_policy.max_attempts + 1):
+        if not circuit_breaker.allow_request():
+            log.error(f"API circuit breaker is open, skipping call to {endpoint}")
+            break
+
+        start_time = time.perf_counter()
         try:
             val = lamb()
         except Exception as e:
-            log.error(f"Exception when calling API: attempt {x}/{retries}")
-            ex = e
+            latency = time.perf_counter() - start_time
+            api_stats.record(endpoint, latency=latency)
+
+            if not retry_policy.is_retryable(e):
+                # The API answered, so it is not down, and a half open trial must end
+                circuit_breaker.record_success()
+                log.exception(f"Fatal exception when calling API {endpoint}\n{e}")
+                break
+
+            circuit_breaker.record_failure()
+            if attempt == retry_policy.max_attempts:
+                log.exception(
+                    f"Unable to fetch from API {endpoint} in {attempt} attempts\n{e}"
+                )
+                break
+
+            delay = retry_policy.get_delay(attempt, e)
+            log.error(
+                f"Exception when calling API {endpoint}: attempt {attempt}/{retry_policy.max_attempts}, "
+                f"retrying in {delay:.1f} seconds"
+            )
+            api_stats.record(endpoint, retries=1, sleep=delay)
+            time.sleep(delay)
         else:
-            return val
+            latency = time.perf_counter() - start_time
+            circuit_breaker.record_success()
+            api_stats.record(endpoint, latency=latency)
+            log.debug(f"API call to {endpoint} took {latency:.2f} seconds")
+            return val, latency
+
+    api_stats.record(endpoint, failures=1)
+    return None, 0.0
 
-        time.sleep(wait_time)
 
-    log.exception(f"Unable to fetch from API in {retries} attempts\n{ex}")
-    return None
+def api_calls(
+    lambs: list[Callable], endpoint: str = "unknown", workers: int = max_workers
+) -> list[list | None]:
+    """
+    Executes several CFBD API calls with at most 'workers' requests in flight. Results
+    are returned in the same order as the given lambdas, regardless of completion order.
+    """
+    if len(lambs) == 0:
+        return []
+
+    start_time = time.perf_counter()
+    if workers <= 1 or len(lambs) == 1:
+        results = [timed_api_call(lamb, endpoint) for lamb in lambs]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(lambs))) as executor:
+            results = list(
+                executor.map(lambda lamb: timed_api_call(lamb, endpoint), lambs)
+            )
+    elapsed_time = time.perf_counter() - start_time
+
+    latencies = [latency for val, latency in results if val is not None]
+    if len(latencies) > 0:
+        log.debug(
+            f"{len(lambs)} API calls to {endpoint} with {workers} workers took {elapsed_time:.2f} seconds "
+            f"(latency min {min(latencies):.2f}s, "
+            f"avg {sum(latencies) / len(latencies):.2f}s, "
+            f"max {max(latencies):.2f}s)"
+        )
+
+    return [val for val, latency in results]
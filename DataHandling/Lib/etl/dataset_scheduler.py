@@ -0,0 +1,138 @@
+import time
+import logging
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from graphlib import TopologicalSorter
+from typing import Callable, Optional
+
+log = logging.getLogger("CfbStats.etl")
+
+
+class DataSetScheduler:
+    """
+    Runs datasets in a thread pool as soon as the datasets they depend on are done, so
+    independent datasets overlap. Dependencies are the 'depends_on' types of each
+    dataset, and dependencies on types that are not scheduled are ignored. Datasets
+    that are ready at the same time start in list order.
+    """
+
+    def __init__(
+        self,
+        datasets: list,
+        max_workers: int,
+        extra_dependencies: Optional[dict] = None,
+    ):
+        """
+        'extra_dependencies' maps datasets to further datasets they have to wait for.
+        Raises 'graphlib.CycleError' if the dependencies contain a cycle.
+        """
+        self.datasets = datasets
+        self.max_workers = max(max_workers, 1)
+        self.dependencies: dict = {
+            ds: {
+                upstream
+                for upstream in datasets
+                if upstream is not ds and isinstance(upstream, tuple(ds.depends_on))
+            }
+            for ds in datasets
+        }
+        for ds, upstream in (extra_dependencies or {}).items():
+            self.dependencies[ds] |= upstream
+
+        TopologicalSorter(self.dependencies).prepare()
+
+        self.start_time = 0.0
+        self.elapsed_time = 0.0
+        self.start_times: dict = {}
+        self.durations: dict = {}
+
+    def run(self, func: Callable[..., bool]) -> bool:
+        """
+        Calls 'func' with every dataset. After a dataset fails, no further datasets are
+        started and False is returned once the running ones are done.
+        """
+        sorter = TopologicalSorter(self.dependencies)
+        sorter.prepare()
+        order = {ds: index for index, ds in enumerate(self.datasets)}
+
+        self.start_time = time.perf_counter()
+        success = True
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running: dict[Future, object] = {}
+            while sorter.is_active():
+                if success:
+                    for ds in sorted(sorter.get_ready(), key=order.get):
+                        running[executor.submit(self.run_dataset, func, ds)] = ds
+
+                if len(running) == 0:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ds = running.pop(future)
+                    if future.result():
+                        sorter.done(ds)
+                    else:
+                        log.error(f"{type(ds).__name__} failed, not starting further datasets")
+                        success = False
+
+        self.elapsed_time = time.perf_counter() - self.start_time
+        return success
+
+    def run_dataset(self, func: Callable[..., bool], ds) -> bool:
+        start_time = time.perf_counter()
+        self.start_times[ds] = start_time - self.start_time
+        try:
+            return func(ds)
+        finally:
+            self.durations[ds] = time.perf_counter() - start_time
+
+    def get_critical_path(self) -> list:
+        """
+        Returns the chain of dependent datasets with the longest total duration, which
+        bounds the run time no matter how many workers are available.
+        """
+        finish_times: dict = {}
+        previous: dict = {}
+        for ds in TopologicalSorter(self.dependencies).static_order():
+            if ds not in self.durations:
+                continue
+
+            upstream = max(
+                (u for u in self.dependencies[ds] if u in finish_times),
+                key=finish_times.get,
+                default=None,
+            )
+            previous[ds] = upstream
+            finish_times[ds] = self.durations[ds] + finish_times.get(upstream, 0.0)
+
+        if len(finish_times) == 0:
+            return []
+
+        path = []
+        ds = max(finish_times, key=finish_times.get)
+        while ds is not None:
+            path.append(ds)
+            ds = previous[ds]
+        return path[::-1]
+
+    def log_report(self):
+        for ds in sorted(self.start_times, key=self.start_times.get):
+            log.debug(
+                f"{type(ds).__name__}: started after {self.start_times[ds]:.2f} seconds, "
+                f"took {self.durations.get(ds, 0.0):.2f} seconds"
+            )
+
+        work_time = sum(self.durations.values())
+        log.info(
+            f"Scheduled {len(self.durations)} datasets with {self.max_workers} workers: "
+            f"{work_time:.2f} seconds of work in {self.elapsed_time:.2f} seconds"
+        )
+
+        path = self.get_critical_path()
+        if len(path) > 0:
+            log.info(
+                f"Critical path ({sum(self.durations[ds] for ds in path):.2f} seconds): "
+                + " -> ".join(
+                    f"{type(ds).__name__} ({self.durations[ds]:.2f}s)" for ds in path
+                )
+            )
@@ -0,0 +1,180 @@
+"""
+Aggregation pipeline stages shared by the datasets that can transform inside MongoDB.
+Pipelines run on the extraction DB and '$merge' their results into staging. Lookups
+are limited to the extraction DB, so entities of staging and production are passed
+into the pipelines as literals.
+"""
+
+from itertools import batched
+from typing import Any
+
+from db.db_connection import *
+from db.model.cfb_model import CfbBaseModel
+from db.model.venue import Venue
+from etl.datasets.dataset_utility import transform_batch_size
+
+# Values rejected by 'validate_mandatory_fields'
+empty_values = [None, "", [], {}]
+
+
+def match_mandatory_fields(*fields: str) -> dict:
+    """Query matching documents that pass 'validate_mandatory_fields'."""
+    return {field: {"$nin": empty_values} for field in fields}
+
+
+def if_null(field: str) -> dict:
+    """Expression for a field that is null when the field is missing, like 'dict.get'."""
+    return {"$ifNull": [f"${field}", None]}
+
+
+def dedupe(*fields: str) -> list[dict]:
+    """
+    Stages keeping only the first document of every key in '_id' order, which is the
+    insertion order the Python transformation reads, like the pending entities.
+    """
+    return [
+        {"$sort": {**{field: 1 for field in fields}, "_id": 1}},
+        {
+            "$group": {
+                "_id": {field: f"${field}" for field in fields},
+                "doc": {"$first": "$$ROOT"},
+            }
+        },
+        {"$replaceRoot": {"newRoot": "$doc"}},
+    ]
+
+
+def merge_into_staging(db_client: DbConnection, model: type[CfbBaseModel]) -> dict:
+    """
+    Final stage inserting the projected documents into the staging collection of a
+    model, unless an entity with the same 'model_keys' is already staged. The staging
+    collection needs a unique index on the keys.
+    """
+    return {
+        "$merge": {
+            "into": {
+                "db": db_client.get_cfb_database(Databases.staging).name,
+                "coll": model.model_id(),
+            },
+            "on": list(model.model_keys()),
+            "whenMatched": "keepExisting",
+            "whenNotMatched": "insert",
+        }
+    }
+
+
+def get_known_values(
+    db_client: DbConnection, model: type[CfbBaseModel], field: str
+) -> list[Any]:
+    """Returns the distinct values of a field in the staging and production collections."""
+    values = set()
+    for db in (Databases.staging, Databases.production):
+        values.update(db_client.get_cfb_collection(db, model).distinct(field))
+    return list(values)
+
+
+def validate_staging(db_client: DbConnection, model: type[CfbBaseModel]) -> int:
+    """
+    Validates the staged documents of a model in batches, as pipelines write them
+    without the model. Raises a validation error for the first invalid batch and
+    returns the number of documents otherwise.
+    """
+    count = 0
+    coll = db_client.get_cfb_collection(Databases.staging, model)
+    for batch in batched(coll.find({}), transform_batch_size):
+        count += len(model.validate_many(list(batch)))
+    return count
+
+
+def lookup_extraction_venue(venue_id_expr: str, known_venue_ids: list[int]) -> list[dict]:
+    """
+    Stages setting the 'venue_id' field of the documents to the referenced venue id if
+    the venue is in staging, production or the extraction DB, and to null otherwise,
+    like 'get_or_create_venue'.
+    """
+    return [
+        {
+            "$lookup": {
+                "from": ExtractionCollections.venue.value,
+                "let": {"venue_id": venue_id_expr},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$id", "$$venue_id"]}}},
+                    {"$match": match_mandatory_fields("id", "name")},
+                    {"$limit": 1},
+                ],
+                "as": "extr_venues",
+            }
+        },
+        {
+            "$set": {
+                "venue_id": {
+                    "$cond": [
+                        {
+                            "$or": [
+                                {"$in": [venue_id_expr, {"$literal": known_venue_ids}]},
+                                {"$gt": [{"$size": "$extr_venues"}, 0]},
+                            ]
+                        },
+                        venue_id_expr,
+                        None,
+                    ]
+                }
+            }
+        },
+    ]
+
+
+def create_venues_pipeline(
+    db_client: DbConnection,
+    referencing_coll: ExtractionCollections,
+    venue_id_expr: str,
+    referencing_stages: list[dict],
+) -> list[dict]:
+    """
+    Pipeline on the extraction venues inserting the venues referenced by the documents
+    of 'referencing_coll' that pass 'referencing_stages', unless they are already in
+    staging or production.
+    """
+    known_venue_ids = get_known_values(db_client, Venue, "venue_id")
+    return [
+        {
+            "$match": {
+                "id": {"$nin": empty_values + known_venue_ids},
+                **match_mandatory_fields("name"),
+            }
+        },
+        {
+            "$lookup": {
+                "from": referencing_coll.value,
+                "let": {"venue_id": "$id"},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": [venue_id_expr, "$$venue_id"]}}},
+                    *referencing_stages,
+                    {"$limit": 1},
+                ],
+                "as": "references",
+            }
+        },
+        {"$match": {"references": {"$ne": []}}},
+        *dedupe("id"),
+        {
+            "$project": {
+                "_id": 0,
+                "venue_id": "$id",
+                "name": "$name",
+                "city": if_null("city"),
+                "state": if_null("state"),
+                "zip": if_null("zip"),
+                "country_code": if_null("countryCode"),
+                "timezone": if_null("timezone"),
+                "latitude": if_null("latitude"),
+                "longitude": if_null("longitude"),
+                "elevation": if_null("elevation"),
+                "capacity": if_null("capacity"),
+                "construction_year": if_null("constructionYear"),
+                "grass": if_null("grass"),
+                "dome": if_null("dome"),
+            }
+        },
+        merge_into_staging(db_client, Venue),
+    ]
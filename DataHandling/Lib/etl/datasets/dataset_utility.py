@@ -2,6 +2,7 @@ from db.db_connection import *
 from db.db_utility import *
 from db.model.conference import Conference
 from db.model.venue import Venue
+from etl.reference_data import ReferenceDataCache
 
 
 def get_repos(
@@ -22,6 +23,34 @@ def get_repos(
     return stage_repo, prod_repo
 
 
+# Number of entity records validated together when staging a batch
+transform_batch_size = 2000
+
+
+def stage_records(
+    db_client: DbConnection,
+    model: type[CfbBaseModel],
+    records: list[dict | CfbBaseModel],
+    operations: WriteBuffer,
+) -> int:
+    """
+    Validates a batch of entity records with a single call and appends their staging
+    inserts. Entities that are already validated are passed through as they are.
+    Returns the number of entities appended.
+    """
+    if len(records) == 0:
+        return 0
+
+    entities = tuple(model.validate_many(records))
+    ops = insert_many_operations(
+        db_client=db_client,
+        db=Databases.staging,
+        entities=entities,
+        do_replace=False,
+    )
+    return operations.extend_entities(ops, entities)
+
+
 def validate_mandatory_fields(entity, *fields) -> bool:
     for field in fields:
         if field not in entity or entity[field] is None:
@@ -40,33 +69,46 @@ def get_or_create_conference(
     db_client: DbConnection,
     conference_name: str,
     classification: str,
-    operations: list,
-    count: int = None,
+    operations: WriteBuffer,
+    reference_data: Optional[ReferenceDataCache] = None,
 ) -> Optional[Conference]:
     """
     Get the conference from the staging or production database, or create it from the extraction database.
+    With 'reference_data' the databases are not queried.
     """
     extr_conference_coll = db_client.get_cfb_collection(
         Databases.extraction, ExtractionCollections.conference
     )
-    prod_conference_repo = db_client.get_cfb_repository(
-        Databases.production, Conference
-    )
+    stage_conference_repo, prod_conference_repo = get_repos(db_client, Conference)
 
-    conference = get_insert_operation_from_list(
-        operations=operations,
-        query={"name": conference_name},
-        namespace=db_client.get_collection_namespace(Databases.staging, Conference),
+    conference = operations.pending.get(
+        db_client.get_collection_namespace(Databases.staging, Conference),
+        {"name": conference_name},
     )
     if conference is not None:
         return Conference.model_construct(**conference)
 
-    conference = prod_conference_repo.find_conference(name=conference_name)
-    if conference is not None:
-        return conference
+    if reference_data is not None:
+        conference = reference_data.get_conference(conference_name)
+        if conference is not None:
+            return conference
+
+        extr_conference = reference_data.get_extraction_conference(
+            conference_name, classification
+        )
+    else:
+        # Staging may still hold entities of an earlier run
+        conference = stage_conference_repo.find_conference(name=conference_name)
+        if conference is not None:
+            return conference
+
+        conference = prod_conference_repo.find_conference(name=conference_name)
+        if conference is not None:
+            return conference
+
+        query = {"name": conference_name, "classification": classification}
+        extr_conference = extr_conference_coll.find_one(query)
 
-    query = {"name": conference_name, "classification": classification}
-    extr_conference = extr_conference_coll.find_one(query)
     if extr_conference is None:
         return None
 
@@ -81,7 +123,6 @@ def get_or_create_conference(
         classification=extr_conference.get("classification"),
     )
 
-    Conference.model_validate(conference)
     op = insert_one_operation(
         db_client=db_client,
         db=Databases.staging,
@@ -89,8 +130,7 @@ def get_or_create_conference(
         do_replace=False,
     )
     if op is not None:
-        operations.append(op)
-        count += 1
+        operations.append_entity(op, conference, {"name": conference.name})
         return conference
     else:
         log.warning(
@@ -101,30 +141,46 @@ def get_or_create_conference(
 
 
 def get_or_create_venue(
-    db_client: DbConnection, venue_id: int, operations: list, count: int = None
+    db_client: DbConnection,
+    venue_id: int,
+    operations: WriteBuffer,
+    reference_data: Optional[ReferenceDataCache] = None,
 ) -> Optional[Venue]:
     """
     Get the venue from the staging or production database, or create it from the extraction database.
+    With 'reference_data' the databases are not queried.
     """
     extr_venue_coll = db_client.get_cfb_collection(
         Databases.extraction, ExtractionCollections.venue
     )
-    prod_venue_repo = db_client.get_cfb_repository(Databases.production, Venue)
+    stage_venue_repo, prod_venue_repo = get_repos(db_client, Venue)
 
-    venue = get_insert_operation_from_list(
-        operations=operations,
-        query={"venue_id": venue_id},
-        namespace=db_client.get_collection_namespace(Databases.staging, Venue),
+    venue = operations.pending.get(
+        db_client.get_collection_namespace(Databases.staging, Venue),
+        {"venue_id": venue_id},
     )
     if venue is not None:
         return Venue.model_construct(**venue)
 
-    venue = prod_venue_repo.find_venue(venue_id)
-    if venue is not None:
-        return venue
+    if reference_data is not None:
+        venue = reference_data.get_venue(venue_id)
+        if venue is not None:
+            return venue
+
+        extr_venue = reference_data.get_extraction_venue(venue_id)
+    else:
+        # Staging may still hold entities of an earlier run
+        venue = stage_venue_repo.find_venue(venue_id)
+        if venue is not None:
+            return venue
+
+        venue = prod_venue_repo.find_venue(venue_id)
+        if venue is not None:
+            return venue
+
+        query = {"id": venue_id}
+        extr_venue = extr_venue_coll.find_one(query)
 
-    query = {"id": venue_id}
-    extr_venue = extr_venue_coll.find_one(query)
     if extr_venue is None:
         return None
 
@@ -148,7 +204,6 @@ def get_or_create_venue(
         dome=extr_venue.get("dome"),
     )
 
-    Venue.model_validate(venue)
     op = insert_one_operation(
         db_client=db_client,
         db=Databases.staging,
@@ -156,8 +211,7 @@ def get_or_create_venue(
         do_replace=False,
     )
     if op is not None:
-        operations.append(op)
-        count += 1
+        operations.append_entity(op, venue, venue.get_model_query())
         return venue
     else:
         log.warning(
@@ -167,6 +221,25 @@ def get_or_create_venue(
     return None
 
 
+def get_game_partitions(db_client: DbConnection) -> list[dict]:
+    """
+    Splits the extraction games by season, week and season type. Each partition is a
+    filter on game ids, so it applies to the game and the game stats collections alike.
+    """
+    extr_game_coll = db_client.get_cfb_collection(
+        Databases.extraction, ExtractionCollections.game
+    )
+
+    partitions: dict[tuple, list[int]] = {}
+    for extr_game in extr_game_coll.find(
+        {}, {"_id": 0, "id": 1, "season": 1, "week": 1, "seasonType": 1}
+    ):
+        key = (extr_game.get("season"), extr_game.get("week"), extr_game.get("seasonType"))
+        partitions.setdefault(key, []).append(extr_game.get("id"))
+
+    return [{"id": {"$in": game_ids}} for game_ids in partitions.values()]
+
+
 def get_game(db_client: DbConnection, game_id: int) -> Game | None:
     """
     Get a game from the staging or production database.
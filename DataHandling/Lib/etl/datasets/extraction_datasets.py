@@ -6,10 +6,60 @@ from db.db_utility import *
 from db.model.game import SeasonType
 from etl.etls.etl import ExtractionDataSet
 from etl.cfbd_connection import *
+from etl.extraction_manifest import is_partition_completed
 
 log = logging.getLogger("CfbStats.etl.datasets")
 
 
+def get_partitions(
+    year_list: list[int], week_list: list[int], season_types: list[SeasonType]
+) -> list[tuple[int, int, SeasonType]]:
+    """Returns the (year, week, season type) partitions covered by the given lists."""
+    partitions = []
+    for year in year_list:
+        for week in week_list:
+            for season_type in season_types:
+                if season_type == SeasonType.POSTSEASON and week > 1:
+                    # Postseason only has week 1 data
+                    continue
+                partitions.append((year, week, season_type))
+
+    return partitions
+
+
+def merge_lists(list1: list, list2: list) -> list:
+    """Returns the union of two lists, keeping the order of the first appearance."""
+    return list(dict.fromkeys([*list1, *list2]))
+
+
+# Estimates used to choose between wide and narrow API calls
+game_bytes = 1500
+call_overhead_bytes = 50 * 1024
+season_games = 3900
+weekly_games = 250
+weekly_games_by_classification = {"fbs": 65, "fcs": 65, "ii": 80, "iii": 120}
+
+
+def estimate_games_transfer(calls: list[dict]) -> int:
+    """
+    Estimates the bytes transferred by a list of get_games calls. Each call also counts
+    a fixed overhead for the round trip.
+    """
+    total = 0
+    for call in calls:
+        if "classification" in call:
+            games = weekly_games_by_classification.get(
+                call["classification"], weekly_games
+            )
+        elif "week" in call:
+            games = weekly_games
+        else:
+            games = season_games
+        total += games * game_bytes + call_overhead_bytes
+
+    return total
+
+
 class ExtractConferenceDataSet(ExtractionDataSet):
     """Extract conferences from CFBD in a given list of classifications."""
 
@@ -20,12 +70,22 @@ class ExtractConferenceDataSet(ExtractionDataSet):
         super().__init__()
         self.class_list = class_list
 
+    def merge(self, other: ExtractionDataSet) -> bool:
+        if not isinstance(other, ExtractConferenceDataSet):
+            return False
+
+        self.class_list = merge_lists(self.class_list, other.class_list)
+        return True
+
+    def get_call_plan(self) -> list[str]:
+        return ["conferences"]
+
     def extract(self, cfbd_client, db_client, operations) -> bool:
 
         api = cfbd.ConferencesApi(cfbd_client)
 
         # Get conferences from API
-        conferences = api_call(lambda: api.get_conferences())
+        conferences = api_call(lambda: api.get_conferences(), "conferences")
         if conferences is None:
             log.warning("No data fetched from API")
             return True
@@ -86,34 +146,104 @@ class ExtractGamesDataSet(ExtractionDataSet):
         self.class_list = class_list
         self.week_list = week_list
         self.season_types = season_types
+        self.partitions = get_partitions(year_list, week_list, season_types)
+
+    def merge(self, other: ExtractionDataSet) -> bool:
+        if not isinstance(other, ExtractGamesDataSet):
+            return False
+
+        self.year_list = merge_lists(self.year_list, other.year_list)
+        self.class_list = merge_lists(self.class_list, other.class_list)
+        self.week_list = merge_lists(self.week_list, other.week_list)
+        self.season_types = merge_lists(self.season_types, other.season_types)
+        self.partitions = merge_lists(self.partitions, other.partitions)
+        return True
+
+    def get_call_plan(self) -> list[str]:
+        return [
+            "games " + " ".join(f"{key}={value}" for key, value in call.items())
+            for call in self.get_calls(self.partitions)
+        ]
+
+    def get_calls(self, partitions: list[tuple[int, int, SeasonType]]) -> list[dict]:
+        """
+        Returns the filters of the get_games calls that cover the given partitions. Each
+        year is either fetched whole, by week, or by week and classification, whichever
+        is estimated to transfer the fewest bytes.
+        """
+        calls = []
+        for year in merge_lists([], [p[0] for p in partitions]):
+            year_partitions = [p for p in partitions if p[0] == year]
+            options = [
+                [{"year": year}],
+                [
+                    {"year": year, "week": week, "season_type": season_type.value}
+                    for _, week, season_type in year_partitions
+                ],
+                [
+                    {
+                        "year": year,
+                        "week": week,
+                        "season_type": season_type.value,
+                        "classification": classification,
+                    }
+                    for _, week, season_type in year_partitions
+                    for classification in self.class_list
+                ],
+            ]
+            calls.extend(min(options, key=estimate_games_transfer))
+
+        return calls
 
     def extract(self, cfbd_client, db_client, operations) -> bool:
         api = cfbd.GamesApi(cfbd_client)
 
-        count = 0
-        games = []
-        for year in self.year_list:
-            games.extend(api_call(lambda: api.get_games(year=year)))
+        partitions = self.get_open_partitions(
+            ExtractionCollections.game, self.partitions, self.class_list
+        )
+        if len(partitions) == 0:
+            log.info("All game partitions are finalized")
+            return True
+
+        calls = self.get_calls(partitions)
+        results = api_calls(
+            [lambda call=call: api.get_games(**call) for call in calls],
+            endpoint="games",
+        )
+
+        # Narrow calls can overlap, e.g. an FBS vs FCS game is returned for both
+        games_by_id = {}
+        for call, result in zip(calls, results):
+            if result is None:
+                log.error(f"Failed to fetch games with filters {call}")
+                return False
+            for game in result:
+                games_by_id.setdefault(game.id, game)
 
-        if games is None or len(games) == 0:
+        count = 0
+        games = list(games_by_id.values())
+        if len(games) == 0:
             log.warning(f"No games data for years {self.year_list}")
             return True
 
+        partition_games = {partition: [] for partition in partitions}
         try:
             for game in games:
                 if (
-                    (
-                        game.home_classification not in self.class_list
-                        and game.away_classification not in self.class_list
-                    )
-                    or not any(
-                        season_type.value == game.season_type
-                        for season_type in self.season_types
-                    )
-                    or game.week not in self.week_list
+                    game.home_classification not in self.class_list
+                    and game.away_classification not in self.class_list
+                ) or not any(
+                    season_type.value == game.season_type
+                    for season_type in self.season_types
                 ):
                     continue
 
+                # Only keep games of requested partitions that are not finalized
+                partition = (game.season, game.week, SeasonType(game.season_type))
+                if partition not in partition_games:
+                    continue
+                partition_games[partition].append(game)
+
                 op = insert_one_operation(
                     db_client=db_client,
                     db=Databases.extraction,
@@ -133,52 +263,116 @@ class ExtractGamesDataSet(ExtractionDataSet):
             log.exception(f"Exception when writing to DB: {e}")
             return False
 
+        if self.manifest is not None:
+            for (year, week, season_type), p_games in partition_games.items():
+                self.manifest.record(
+                    ExtractionCollections.game,
+                    year,
+                    week,
+                    season_type,
+                    count=len(p_games),
+                    classifications=self.class_list,
+                    completed=is_partition_completed(year, p_games),
+                )
+
         log.debug(f"Extracted {count} games")
         return True
 
 
 class ExtractGameTeamStats(ExtractionDataSet):
-    """Extract game team statistics from CFBD."""
+    """
+    Extract game team statistics from CFBD. Statistics are fetched for all teams, but
+    only the ones of games of 'class_list' are transformed, so partitions are recorded
+    for those classifications.
+    """
 
     def __init__(
         self,
         year_list: list[int],
+        class_list: list[str],
         week_list: list[int],
         season_types: list[SeasonType],
+        workers: int = max_workers,
     ):
         if year_list is None or len(year_list) == 0:
             raise ValueError("No years were specified")
+        if class_list is None or len(class_list) == 0:
+            raise ValueError("No classifications were specified")
         if week_list is None or len(week_list) == 0:
             raise ValueError("No weeks were specified")
         if season_types is None or len(season_types) == 0:
             raise ValueError("No season types were specified")
+        if workers < 1:
+            raise ValueError("At least one worker must be specified")
 
         super().__init__()
         self.year_list = year_list
+        self.class_list = class_list
         self.week_list = week_list
         self.season_types = season_types
+        self.workers = workers
+        self.partitions = get_partitions(year_list, week_list, season_types)
+
+    def merge(self, other: ExtractionDataSet) -> bool:
+        if not isinstance(other, ExtractGameTeamStats):
+            return False
+
+        self.year_list = merge_lists(self.year_list, other.year_list)
+        self.class_list = merge_lists(self.class_list, other.class_list)
+        self.week_list = merge_lists(self.week_list, other.week_list)
+        self.season_types = merge_lists(self.season_types, other.season_types)
+        self.workers = max(self.workers, other.workers)
+        self.partitions = merge_lists(self.partitions, other.partitions)
+        return True
+
+    def get_call_plan(self) -> list[str]:
+        return [
+            f"games/teams year={year} week={week} seasonType={season_type.value}"
+            for year, week, season_type in self.partitions
+        ]
 
     def extract(self, cfbd_client, db_client, operations) -> bool:
 
         api = cfbd.GamesApi(cfbd_client)
 
+        partitions = self.get_open_partitions(
+            ExtractionCollections.game_team_stats, self.partitions, self.class_list
+        )
+        if len(partitions) == 0:
+            log.info("All game stats partitions are finalized")
+            return True
+
+        # Get weekly game statistics from API. Results keep the partition order.
+        results = api_calls(
+            [
+                lambda year=year, week=week, season_type=season_type: api.get_game_team_stats(
+                    year=year, week=week, season_type=season_type.value
+                )
+                for year, week, season_type in partitions
+            ],
+            endpoint="games/teams",
+            workers=self.workers,
+        )
+
         count = 0
         game_stats = []
-        for year in self.year_list:
-            for week in self.week_list:
-                for season_type in self.season_types:
-                    if season_type == SeasonType.POSTSEASON and week > 1:
-                        # Postseason only has week 1 data
-                        continue
-
-                    # Get weekly game statistics from API
-                    game_stats.extend(
-                        api_call(
-                            lambda: api.get_game_team_stats(
-                                year=year, week=week, season_type=season_type.value
-                            )
-                        )
-                    )
+        for (year, week, season_type), result in zip(partitions, results):
+            if result is None:
+                log.error(
+                    f"Failed to fetch game stats for year {year} week {week} season type {season_type.value}"
+                )
+                return False
+            game_stats.extend(result)
+
+            if self.manifest is not None:
+                self.manifest.record(
+                    ExtractionCollections.game_team_stats,
+                    year,
+                    week,
+                    season_type,
+                    count=len(result),
+                    classifications=self.class_list,
+                )
 
         if game_stats is None or len(game_stats) == 0:
             log.warning(
@@ -225,6 +419,18 @@ class ExtractTeamDataSet(ExtractionDataSet):
         self.year_list = year_list
         self.class_list = class_list
 
+    def merge(self, other: ExtractionDataSet) -> bool:
+        if not isinstance(other, ExtractTeamDataSet):
+            return False
+
+        self.year_list = merge_lists(self.year_list, other.year_list)
+        self.class_list = merge_lists(self.class_list, other.class_list)
+        return True
+
+    def get_call_plan(self) -> list[str]:
+        endpoint = "teams/fbs" if self.class_list == ["fbs"] else "teams"
+        return [f"{endpoint} year={year}" for year in self.year_list]
+
     def extract(
         self, cfbd_client: CfbdConnection, db_client: DbConnection, operations
     ) -> bool:
@@ -232,8 +438,12 @@ class ExtractTeamDataSet(ExtractionDataSet):
         api = cfbd.TeamsApi(cfbd_client)
         for year in self.year_list:
 
-            # Get teams from API
-            teams = api_call(lambda: api.get_teams(year=year))
+            # Get teams from API. The teams endpoint cannot filter by classification,
+            # but FBS teams have their own endpoint.
+            if self.class_list == ["fbs"]:
+                teams = api_call(lambda: api.get_fbs_teams(year=year), "teams/fbs")
+            else:
+                teams = api_call(lambda: api.get_teams(year=year), "teams")
             if teams == None:
                 log.warning("No data fetched from API")
                 return True
@@ -275,11 +485,17 @@ class ExtractVenueDataSet(ExtractionDataSet):
     def __init__(self):
         super().__init__()
 
+    def merge(self, other: ExtractionDataSet) -> bool:
+        return isinstance(other, ExtractVenueDataSet)
+
+    def get_call_plan(self) -> list[str]:
+        return ["venues"]
+
     def extract(self, cfbd_client, db_client, operations) -> bool:
         api = cfbd.VenuesApi(cfbd_client)
 
         # Get venue from API
-        venues = api_call(lambda: api.get_venues())
+        venues = api_call(lambda: api.get_venues(), "venues")
         if venues == None:
             log.warning("No data fetched from API")
             return True
@@ -5,6 +5,7 @@ from db.model.game import Game
 from db.model.game_repository import GameRepository
 from etl.etls.etl import *
 from etl.datasets.dataset_utility import *
+from etl.datasets.aggregation_utility import *
 from etl.datasets.extraction_datasets import *
 
 log = logging.getLogger("CfbStats.etl.datasets")
@@ -40,20 +41,18 @@ class GameDataset(DataSet):
 
         self.models = {Game: True, Venue: False}
 
-    def transform(self, db_client: DbConnection, operations: list) -> bool:
+    def get_transform_partitions(self, db_client: DbConnection) -> list[dict]:
+        return get_game_partitions(db_client)
+
+    def get_aggregation_pipelines(
+        self, db_client: DbConnection
+    ) -> list[tuple[ExtractionCollections, list[dict]]]:
         """
-        Transform game data from extraction database to staging database.
+        Pipelines creating the referenced venues and the games, matching 'transform'.
         """
-        try:
-            extr_game_coll = db_client.get_cfb_collection(
-                Databases.extraction, ExtractionCollections.game
-            )
-
-            count = 0
-            extr_games = extr_game_coll.find()
-            for extr_game in extr_games:
-                validate_fields = validate_mandatory_fields(
-                    extr_game,
+        valid_game_stages = [
+            {
+                "$match": match_mandatory_fields(
                     "id",
                     "season",
                     "week",
@@ -63,69 +62,137 @@ class GameDataset(DataSet):
                     "homeId",
                     "awayId",
                 )
-                if not validate_fields:
-                    log.warning(
-                        f"GameDataset: Skipping game with id {extr_game.get('id')} due to missing mandatory field(s)"
-                    )
-                    continue
+            },
+            {
+                "$match": {
+                    "$or": [
+                        {"completed": {"$ne": True}},
+                        match_mandatory_fields("homePoints", "awayPoints"),
+                    ]
+                }
+            },
+        ]
 
-                winning_team_id = None
-                if extr_game.get("completed") is True:
-                    validate_fields = validate_mandatory_fields(
-                        extr_game, "homePoints", "awayPoints"
-                    )
-                    if not validate_fields:
-                        log.warning(
-                            f"GameDataset: Skipping completed game with id {extr_game.get('id')} due to missing mandatory field(s)"
-                        )
-                        continue
-
-                    if extr_game.get("homePoints") > extr_game.get("awayPoints"):
-                        winning_team_id = extr_game.get("homeId")
-                    else:
-                        winning_team_id = extr_game.get("awayId")
-
-                venue = get_or_create_venue(
-                    db_client, extr_game.get("venueId"), operations, count=count
-                )
-                if venue is None:
-                    log.warning(f"GameDataset: {extr_game.get('id')} has no venue")
-
-                game = Game(
-                    game_id=extr_game.get("id"),
-                    season=extr_game.get("season"),
-                    week=extr_game.get("week"),
-                    season_type=extr_game.get("seasonType"),
-                    start_date=extr_game.get("startDate"),
-                    start_time_tbd=extr_game.get("startTimeTBD"),
-                    completed=extr_game.get("completed"),
-                    neutral_site=extr_game.get("neutralSite"),
-                    conference_game=extr_game.get("conferenceGame"),
-                    attendance=extr_game.get("attendance"),
-                    venue_id=venue.venue_id if venue is not None else None,
-                    home_id=extr_game.get("homeId"),
-                    away_id=extr_game.get("awayId"),
-                    winning_team_id=winning_team_id,
-                    notes=extr_game.get("notes"),
+        venues_pipeline = create_venues_pipeline(
+            db_client, ExtractionCollections.game, "$venueId", valid_game_stages
+        )
+
+        games_pipeline = [
+            *valid_game_stages,
+            *dedupe("id"),
+            *lookup_extraction_venue(
+                "$venueId", get_known_values(db_client, Venue, "venue_id")
+            ),
+            {
+                "$project": {
+                    "_id": 0,
+                    "game_id": "$id",
+                    "season": "$season",
+                    "week": "$week",
+                    "season_type": "$seasonType",
+                    "start_date": if_null("startDate"),
+                    "start_time_tbd": "$startTimeTBD",
+                    "completed": "$completed",
+                    "neutral_site": if_null("neutralSite"),
+                    "conference_game": if_null("conferenceGame"),
+                    "attendance": if_null("attendance"),
+                    "venue_id": "$venue_id",
+                    "home_id": "$homeId",
+                    "away_id": "$awayId",
+                    "winning_team_id": {
+                        "$cond": [
+                            {"$eq": ["$completed", True]},
+                            {
+                                "$cond": [
+                                    {"$gt": ["$homePoints", "$awayPoints"]},
+                                    "$homeId",
+                                    "$awayId",
+                                ]
+                            },
+                            None,
+                        ]
+                    },
+                    "notes": if_null("notes"),
+                }
+            },
+            merge_into_staging(db_client, Game),
+        ]
+
+        return [
+            (ExtractionCollections.venue, venues_pipeline),
+            (ExtractionCollections.game, games_pipeline),
+        ]
+
+    def generate_entities(
+        self, db_client: DbConnection, operations: WriteBuffer
+    ) -> Iterator[tuple[type[CfbBaseModel], dict]]:
+        """
+        Yields the game records of the extraction games and creates their venues.
+        """
+        extr_game_coll = db_client.get_cfb_collection(
+            Databases.extraction, ExtractionCollections.game
+        )
+
+        extr_games = extr_game_coll.find(
+            self.partition or {}, batch_size=transform_batch_size
+        )
+        for extr_game in extr_games:
+            validate_fields = validate_mandatory_fields(
+                extr_game,
+                "id",
+                "season",
+                "week",
+                "seasonType",
+                "completed",
+                "startTimeTBD",
+                "homeId",
+                "awayId",
+            )
+            if not validate_fields:
+                log.warning(
+                    f"GameDataset: Skipping game with id {extr_game.get('id')} due to missing mandatory field(s)"
                 )
+                continue
 
-                Game.model_validate(game)
-                op = insert_one_operation(
-                    db_client=db_client,
-                    db=Databases.staging,
-                    entity=game,
-                    do_replace=False,
+            winning_team_id = None
+            if extr_game.get("completed") is True:
+                validate_fields = validate_mandatory_fields(
+                    extr_game, "homePoints", "awayPoints"
                 )
-                if op is not None:
-                    operations.append(op)
-                    count += 1
-                else:
+                if not validate_fields:
                     log.warning(
-                        f"GameDataset: Failed to create insert operation for game id {game.game_id}"
+                        f"GameDataset: Skipping completed game with id {extr_game.get('id')} due to missing mandatory field(s)"
                     )
+                    continue
+
+                if extr_game.get("homePoints") > extr_game.get("awayPoints"):
+                    winning_team_id = extr_game.get("homeId")
+                else:
+                    winning_team_id = extr_game.get("awayId")
+
+            venue = get_or_create_venue(
+                db_client,
+                extr_game.get("venueId"),
+                operations,
+                reference_data=self.reference_data,
+            )
+            if venue is None:
+                log.warning(f"GameDataset: {extr_game.get('id')} has no venue")
 
-            log.debug(f"GameDataset: Transformed {count} entities")
-            return True
-        except Exception as e:
-            log.exception(f"GameDataset: Exception during transform: {e}")
-            return False
+            yield Game, {
+                "game_id": extr_game.get("id"),
+                "season": extr_game.get("season"),
+                "week": extr_game.get("week"),
+                "season_type": extr_game.get("seasonType"),
+                "start_date": extr_game.get("startDate"),
+                "start_time_tbd": extr_game.get("startTimeTBD"),
+                "completed": extr_game.get("completed"),
+                "neutral_site": extr_game.get("neutralSite"),
+                "conference_game": extr_game.get("conferenceGame"),
+                "attendance": extr_game.get("attendance"),
+                "venue_id": venue.venue_id if venue is not None else None,
+                "home_id": extr_game.get("homeId"),
+                "away_id": extr_game.get("awayId"),
+                "winning_team_id": winning_team_id,
+                "notes": extr_game.get("notes"),
+            }
@@ -1,6 +1,6 @@
 import logging
 from datetime import time
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
 from db.db_connection import *
 from db.db_cleanup import cleanup_staging_collections
 from db.model.game import GameTeamStats, SeasonType
@@ -23,8 +23,14 @@ class GameStatsDataset(DataSet):
         classifications: list[str],
         weeks: list[int],
         season_types: list[SeasonType],
+        batch_size: Optional[int] = transform_batch_size,
     ):
+        """
+        With a 'batch_size', team stats are transformed column by column in batches of
+        that size, otherwise one at a time. Both produce the same entities.
+        """
         super().__init__()
+        self.batch_size = batch_size
         self.years = years
         self.classifications = classifications
         self.weeks = weeks
@@ -38,88 +44,164 @@ class GameStatsDataset(DataSet):
                 season_types=season_types,
             ),
             ExtractGameTeamStats(
-                year_list=years, week_list=weeks, season_types=self.season_types
+                year_list=years,
+                class_list=classifications,
+                week_list=weeks,
+                season_types=self.season_types,
             ),
         }
 
         self.models = {GameTeamStats: True}
 
-    def transform(self, db_client: DbConnection, operations: list) -> bool:
+    def get_transform_partitions(self, db_client: DbConnection) -> list[dict]:
+        return get_game_partitions(db_client)
+
+    def generate_entities(
+        self, db_client: DbConnection, operations: WriteBuffer
+    ) -> Iterator[tuple[type[CfbBaseModel], GameTeamStats]]:
         """
-        Transform game statistics data from extraction database to staging database.
+        Yields the game team stats of the extraction game stats. Without a partition, the
+        game stats are joined with their games one partition at a time, so only the games
+        of a single week are held.
         """
-        try:
-            extr_games_coll = db_client.get_cfb_collection(
-                Databases.extraction, ExtractionCollections.game
+        extr_games_coll = db_client.get_cfb_collection(
+            Databases.extraction, ExtractionCollections.game
+        )
+
+        extr_game_stats_coll = db_client.get_cfb_collection(
+            Databases.extraction, ExtractionCollections.game_team_stats
+        )
+
+        partitions = (
+            [self.partition]
+            if self.partition is not None
+            else get_game_partitions(db_client)
+        )
+        for partition in partitions:
+            # Join game stats with their games in memory instead of a lookup per stat
+            extr_games = self.get_games_by_id(extr_games_coll, partition)
+            extr_game_stats = extr_game_stats_coll.find(
+                partition, batch_size=transform_batch_size
             )
 
-            extr_game_stats_coll = db_client.get_cfb_collection(
-                Databases.extraction, ExtractionCollections.game_team_stats
+            if self.batch_size is not None:
+                game_team_stats = self.generate_batches(extr_game_stats, extr_games)
+            else:
+                game_team_stats = self.generate_rows(extr_game_stats, extr_games)
+
+            for game_team_stat in game_team_stats:
+                yield GameTeamStats, game_team_stat
+
+    def generate_rows(
+        self, extr_game_stats: Iterable[dict], extr_games: dict[int, dict]
+    ) -> Iterator[GameTeamStats]:
+        """Transforms the team stats one at a time with 'create_game_team_stat'."""
+        for extr_game_stat in extr_game_stats:
+            validate_fields = validate_mandatory_fields(extr_game_stat, "id", "teams")
+            if not validate_fields:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing mandatory field(s)"
+                )
+                continue
+
+            extr_game = extr_games.get(extr_game_stat.get("id"))
+            if extr_game is None:
+                continue
+
+            home_team_stat = self.create_game_team_stat(
+                extr_game_stat,
+                extr_game.get("homeId"),
+                extr_game.get("homeLineScores", []),
             )
+            if home_team_stat is None:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing home team stat"
+                )
+                continue
 
-            count = 0
-            extr_game_stats = extr_game_stats_coll.find()
-            for extr_game_stat in extr_game_stats:
-                validate_fields = validate_mandatory_fields(
-                    extr_game_stat, "id", "teams"
+            away_team_stat = self.create_game_team_stat(
+                extr_game_stat,
+                extr_game.get("awayId"),
+                extr_game.get("awayLineScores", []),
+            )
+            if away_team_stat is None:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing away team stat"
                 )
-                if not validate_fields:
-                    log.warning(
-                        f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing mandatory field(s)"
-                    )
-                    continue
-
-                extr_game = extr_games_coll.find_one({"id": extr_game_stat.get("id")})
-                if extr_game is None:
-                    continue
-
-                home_team_stat = self.create_game_team_stat(
-                    extr_game_stat,
-                    extr_game.get("homeId"),
-                    extr_game.get("homeLineScores", []),
+                continue
+
+            yield home_team_stat
+            yield away_team_stat
+
+    def generate_batches(
+        self, extr_game_stats: Iterable[dict], extr_games: dict[int, dict]
+    ) -> Iterator[GameTeamStats]:
+        """
+        Joins the team stats with their games and transforms them in batches with
+        'create_game_team_stats'.
+        """
+        batch: list[tuple[int, int, list[int], dict]] = []
+        for extr_game_stat in extr_game_stats:
+            validate_fields = validate_mandatory_fields(extr_game_stat, "id", "teams")
+            if not validate_fields:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing mandatory field(s)"
                 )
-                if home_team_stat is None:
-                    log.warning(
-                        f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing home team stat"
-                    )
-                    continue
-
-                away_team_stat = self.create_game_team_stat(
-                    extr_game_stat,
-                    extr_game.get("awayId"),
-                    extr_game.get("awayLineScores", []),
+                continue
+
+            game_id = extr_game_stat.get("id")
+            extr_game = extr_games.get(game_id)
+            if extr_game is None:
+                continue
+
+            home_id = extr_game.get("homeId")
+            home_team_stat = self.get_team_stat(extr_game_stat, home_id)
+            if home_team_stat is None:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {game_id} due to missing home team stat"
                 )
-                if away_team_stat is None:
-                    log.warning(
-                        f"GameStatsDataset: Skipping game stat with id {extr_game_stat.get('id')} due to missing away team stat"
-                    )
-                    continue
-
-                ops = insert_many_operations(
-                    db_client=db_client,
-                    db=Databases.staging,
-                    entities=(home_team_stat, away_team_stat),
-                    do_replace=False,
+                continue
+
+            away_id = extr_game.get("awayId")
+            away_team_stat = self.get_team_stat(extr_game_stat, away_id)
+            if away_team_stat is None:
+                log.warning(
+                    f"GameStatsDataset: Skipping game stat with id {game_id} due to missing away team stat"
                 )
-                if len(ops) == 2:
-                    operations.extend(ops)
-                    count += 2
-                else:
-                    log.warning(
-                        f"GameStatsDataset: Failed to create insert operations for game stat with id {extr_game_stat.get('id')}"
-                    )
-
-            log.debug(f"GameStatsDataset: Transformed {count} entities")
-            return True
-        except Exception as e:
-            log.exception(f"GameStatsDataset: Exception during transform: {e}")
-            return False
+                continue
 
-    def create_game_team_stat(
-        self, extr_game_stat: dict, team_id: int, line_scores: list[int]
-    ) -> GameTeamStats | None:
+            batch.append(
+                (game_id, home_id, extr_game.get("homeLineScores", []), home_team_stat)
+            )
+            batch.append(
+                (game_id, away_id, extr_game.get("awayLineScores", []), away_team_stat)
+            )
+            if len(batch) >= self.batch_size:
+                yield from self.create_game_team_stats(batch)
+                batch = []
+
+        if len(batch) > 0:
+            yield from self.create_game_team_stats(batch)
+
+    def get_games_by_id(
+        self, extr_games_coll: Collection, partition: dict
+    ) -> dict[int, dict]:
+        """Loads the game fields needed by the transform in a single query."""
+        extr_games = extr_games_coll.find(
+            partition,
+            {
+                "_id": 0,
+                "id": 1,
+                "homeId": 1,
+                "homeLineScores": 1,
+                "awayId": 1,
+                "awayLineScores": 1,
+            },
+        )
+        return {extr_game.get("id"): extr_game for extr_game in extr_games}
 
-        extr_team_stat = next(
+    def get_team_stat(self, extr_game_stat: dict, team_id: int) -> dict | None:
+        return next(
             (
                 team_stat
                 for team_stat in extr_game_stat.get("teams", [])
@@ -127,6 +209,12 @@ class GameStatsDataset(DataSet):
             ),
             None,
         )
+
+    def create_game_team_stat(
+        self, extr_game_stat: dict, team_id: int, line_scores: list[int]
+    ) -> GameTeamStats | None:
+
+        extr_team_stat = self.get_team_stat(extr_game_stat, team_id)
         if extr_team_stat is None:
             return None
 
@@ -213,6 +301,93 @@ class GameStatsDataset(DataSet):
 
         return game_stat
 
+    def create_game_team_stats(
+        self, batch: list[tuple[int, int, list[int], dict]]
+    ) -> list[GameTeamStats]:
+        """
+        Column oriented version of 'create_game_team_stat' for a batch of
+        (game id, team id, line scores, team stat) rows. String stats repeat a lot, so
+        every distinct value of a column is only parsed once, and the entities are
+        validated with a single call.
+        """
+        team_stats = [row[3] for row in batch]
+
+        def column(key: str) -> list:
+            return [team_stat.get(key) for team_stat in team_stats]
+
+        completion_attempts = column("completionAttempts")
+        completions = [ca[0] if ca is not None else None for ca in completion_attempts]
+        passing_attempts = [
+            ca[1] if ca is not None else None for ca in completion_attempts
+        ]
+        passing_yards = column("netPassingYards")
+        rushing_attempts = column("rushingAttempts")
+        rushing_yards = column("rushingYards")
+
+        penalties = parse_column(
+            column("totalPenaltiesYards"), self.parse_penalty_stat
+        )
+
+        columns = {
+            "game_id": [row[0] for row in batch],
+            "team_id": [row[1] for row in batch],
+            "points": column("points"),
+            "line_scores": [row[2] for row in batch],
+            "possession_time": parse_column(
+                column("possessionTime"), self.parse_possession_time
+            ),
+            "total_yards": column("totalYards"),
+            "rushing_yards": rushing_yards,
+            "rushing_attempts": rushing_attempts,
+            "yards_per_rush_attempt": list(
+                map(self.calculate_yards_per_attempt, rushing_yards, rushing_attempts)
+            ),
+            "rushing_tds": column("rushingTDs"),
+            "passing_yards": passing_yards,
+            "completions": completions,
+            "passing_attempts": passing_attempts,
+            "yards_per_pass": list(
+                map(self.calculate_yards_per_attempt, passing_yards, passing_attempts)
+            ),
+            "yards_per_completion": list(
+                map(self.calculate_yards_per_attempt, passing_yards, completions)
+            ),
+            "passing_tds": column("passingTDs"),
+            "total_penalties": [p[0] if p else None for p in penalties],
+            "total_penalties_yards": [p[1] if p else None for p in penalties],
+            "first_downs": column("firstDowns"),
+            "third_down_eff": parse_column(
+                column("thirdDownEff"), self.parse_efficiency_stat
+            ),
+            "fourth_down_eff": parse_column(
+                column("fourthDownEff"), self.parse_efficiency_stat
+            ),
+            "turnovers": column("turnovers"),
+            "total_fumbles": column("totalFumbles"),
+            "fumbles_lost": column("fumblesLost"),
+            "interceptions": column("interceptions"),
+            "tackles": column("tackles"),
+            "tackles_for_loss": column("tacklesForLoss"),
+            "qb_hurries": column("qbHurries"),
+            "sacks": column("sacks"),
+            "passes_deflected": column("passesDeflected"),
+            "fumbles_recovered": column("fumblesRecovered"),
+            "passes_intercepted": column("passesIntercepted"),
+            "interception_tds": column("interceptionTDs"),
+            "interception_yards": column("interceptionYards"),
+            "defensive_tds": column("defensiveTDs"),
+            "kicking_points": column("kickingPoints"),
+            "kick_returns": column("kickReturns"),
+            "kick_return_tds": column("kickReturnTDs"),
+            "kick_return_yards": column("kickReturnYards"),
+            "punt_returns": column("puntReturns"),
+            "punt_return_tds": column("puntReturnTDs"),
+            "punt_return_yards": column("puntReturnYards"),
+        }
+
+        records = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        return GameTeamStats.validate_many(records)
+
     def parse_efficiency_stat(self, stat_str: Optional[str]) -> Optional[list[int]]:
         """Parse efficiency stat from 'X-Y' format to [X, Y] list."""
         if stat_str is None:
@@ -255,3 +430,22 @@ class GameStatsDataset(DataSet):
             return 0
         else:
             return round(yards / attempts, 1)
+
+
+def parse_column(values: list, parse: Callable) -> list:
+    """
+    Parses a column of stat strings, parsing every distinct string only once. Parsed
+    lists are copied so rows do not share them.
+    """
+    parsed = {}
+    results = []
+    for value in values:
+        if not isinstance(value, str):
+            results.append(parse(value))
+            continue
+
+        if value not in parsed:
+            parsed[value] = parse(value)
+        result = parsed[value]
+        results.append(list(result) if isinstance(result, list) else result)
+    return results
@@ -7,6 +7,7 @@ from db.model.conference import *
 from db.model.venue import *
 from etl.etls.etl import *
 from etl.datasets.dataset_utility import *
+from etl.datasets.aggregation_utility import *
 from etl.datasets.extraction_datasets import *
 
 log = logging.getLogger("CfbStats.etl.datasets")
@@ -29,94 +30,252 @@ class TeamDataset(DataSet):
 
         self.models = {Team: False, TeamExt: False, Conference: False, Venue: False}
 
-    def transform(self, db_client, operations) -> bool:
-        try:
-            extr_team_coll: Collection = db_client.get_cfb_collection(
-                Databases.extraction, ExtractionCollections.team
+    def get_aggregation_pipelines(
+        self, db_client: DbConnection
+    ) -> list[tuple[ExtractionCollections, list[dict]]]:
+        """
+        Pipelines creating the referenced conferences and venues, the teams and their
+        extensions, matching 'transform'.
+        """
+        known_conferences = [
+            {"name": conference["name"], "conference_id": conference["conference_id"]}
+            for db in (Databases.staging, Databases.production)
+            for conference in db_client.get_cfb_collection(db, Conference).find(
+                {}, {"_id": 0, "name": 1, "conference_id": 1}
             )
+        ]
 
-            count = 0
-            extr_teams = extr_team_coll.find()
-            for extr_team in extr_teams:
-                validate_fields = validate_mandatory_fields(
-                    extr_team,
-                    "id",
-                    "year",
-                    "school",
-                    "conference",
-                    "classification",
-                    "location",
-                )
-                if not validate_fields:
-                    log.warning(
-                        f"TeamDataset: Skipping {extr_team.get("school")} due to missing mandatory field(s)"
-                    )
-                    continue
-
-                if extr_team["classification"] not in self.classifications:
-                    continue
-
-                conference = get_or_create_conference(
-                    db_client,
-                    extr_team.get("conference"),
-                    extr_team.get("classification"),
-                    operations,
-                    count,
-                )
-                if conference is None:
-                    log.warning(
-                        f"TeamDataset: {extr_team.get('school')} has no conference, skipping"
-                    )
-                    continue
-
-                venue = get_or_create_venue(
-                    db_client, extr_team.get("location").get("id"), operations, count
-                )
-                if venue is None:
-                    log.warning(f"TeamDataset: {extr_team.get('school')} has no venue")
-
-                team = Team(
-                    team_id=extr_team.get("id"),
-                    year=extr_team.get("year"),
-                    school=extr_team.get("school"),
-                    conference_id=conference.conference_id,
-                    classification=extr_team.get("classification"),
-                    division=extr_team.get("division"),
-                    venue_id=None,
-                )
-                if venue is not None:
-                    team.venue_id = venue.venue_id
-
-                team_ext = TeamExt(
-                    team_id=extr_team.get("id"),
-                    year=extr_team.get("year"),
-                    mascot=extr_team.get("mascot"),
-                    abbreviation=extr_team.get("abbreviation"),
-                    alternate_names=extr_team.get("alternateNames"),
-                    color=extr_team.get("color"),
-                    alternate_color=extr_team.get("alternateColor"),
-                    logos=extr_team.get("logos"),
-                    twitter=extr_team.get("twitter"),
+        valid_team_stages = [
+            {
+                "$match": {
+                    **match_mandatory_fields(
+                        "id", "year", "school", "conference", "location"
+                    ),
+                    "classification": {
+                        "$nin": empty_values,
+                        "$in": self.classifications,
+                    },
+                }
+            },
+            {
+                "$lookup": {
+                    "from": ExtractionCollections.conference.value,
+                    "let": {"name": "$conference", "classification": "$classification"},
+                    "pipeline": [
+                        {
+                            "$match": {
+                                "$expr": {
+                                    "$and": [
+                                        {"$eq": ["$name", "$$name"]},
+                                        {"$eq": ["$classification", "$$classification"]},
+                                    ]
+                                }
+                            }
+                        },
+                        {"$match": match_mandatory_fields("id", "name", "classification")},
+                        {"$limit": 1},
+                    ],
+                    "as": "extr_conferences",
+                }
+            },
+            {
+                "$set": {
+                    "conference_id": {
+                        "$ifNull": [
+                            {
+                                "$arrayElemAt": [
+                                    {
+                                        "$map": {
+                                            "input": {
+                                                "$filter": {
+                                                    "input": {"$literal": known_conferences},
+                                                    "cond": {
+                                                        "$eq": ["$$this.name", "$conference"]
+                                                    },
+                                                }
+                                            },
+                                            "in": "$$this.conference_id",
+                                        }
+                                    },
+                                    0,
+                                ]
+                            },
+                            {"$arrayElemAt": ["$extr_conferences.id", 0]},
+                        ]
+                    }
+                }
+            },
+            # Teams without a conference are skipped
+            {"$match": {"conference_id": {"$ne": None}}},
+        ]
+
+        conferences_pipeline = [
+            {
+                "$match": {
+                    **match_mandatory_fields("id", "classification"),
+                    "name": {
+                        "$nin": empty_values + [c["name"] for c in known_conferences]
+                    },
+                }
+            },
+            {
+                "$lookup": {
+                    "from": ExtractionCollections.team.value,
+                    "let": {"name": "$name", "classification": "$classification"},
+                    "pipeline": [
+                        {
+                            "$match": {
+                                "$expr": {
+                                    "$and": [
+                                        {"$eq": ["$conference", "$$name"]},
+                                        {"$eq": ["$classification", "$$classification"]},
+                                    ]
+                                }
+                            }
+                        },
+                        valid_team_stages[0],
+                        {"$limit": 1},
+                    ],
+                    "as": "references",
+                }
+            },
+            {"$match": {"references": {"$ne": []}}},
+            *dedupe("name"),
+            {
+                "$project": {
+                    "_id": 0,
+                    "conference_id": "$id",
+                    "name": "$name",
+                    "classification": "$classification",
+                    "short_name": if_null("shortName"),
+                    "abbreviation": if_null("abbreviation"),
+                }
+            },
+            merge_into_staging(db_client, Conference),
+        ]
+
+        venues_pipeline = create_venues_pipeline(
+            db_client, ExtractionCollections.team, "$location.id", valid_team_stages
+        )
+
+        teams_pipeline = [
+            *valid_team_stages,
+            *dedupe("id", "year"),
+            *lookup_extraction_venue(
+                "$location.id", get_known_values(db_client, Venue, "venue_id")
+            ),
+            {
+                "$project": {
+                    "_id": 0,
+                    "team_id": "$id",
+                    "year": "$year",
+                    "school": "$school",
+                    "conference_id": "$conference_id",
+                    "classification": "$classification",
+                    "division": if_null("division"),
+                    "venue_id": "$venue_id",
+                }
+            },
+            merge_into_staging(db_client, Team),
+        ]
+
+        team_ext_pipeline = [
+            *valid_team_stages,
+            *dedupe("id", "year"),
+            {
+                "$project": {
+                    "_id": 0,
+                    "team_id": "$id",
+                    "year": "$year",
+                    "mascot": if_null("mascot"),
+                    "abbreviation": if_null("abbreviation"),
+                    "alternate_names": if_null("alternateNames"),
+                    "color": if_null("color"),
+                    "alternate_color": if_null("alternateColor"),
+                    "logos": if_null("logos"),
+                    "twitter": if_null("twitter"),
+                }
+            },
+            merge_into_staging(db_client, TeamExt),
+        ]
+
+        return [
+            (ExtractionCollections.conference, conferences_pipeline),
+            (ExtractionCollections.venue, venues_pipeline),
+            (ExtractionCollections.team, teams_pipeline),
+            (ExtractionCollections.team, team_ext_pipeline),
+        ]
+
+    def generate_entities(
+        self, db_client: DbConnection, operations: WriteBuffer
+    ) -> Iterator[tuple[type[CfbBaseModel], dict]]:
+        """
+        Yields the team and team extension records of the extraction teams and creates
+        their conferences and venues.
+        """
+        extr_team_coll: Collection = db_client.get_cfb_collection(
+            Databases.extraction, ExtractionCollections.team
+        )
+
+        extr_teams = extr_team_coll.find(batch_size=transform_batch_size)
+        for extr_team in extr_teams:
+            validate_fields = validate_mandatory_fields(
+                extr_team,
+                "id",
+                "year",
+                "school",
+                "conference",
+                "classification",
+                "location",
+            )
+            if not validate_fields:
+                log.warning(
+                    f"TeamDataset: Skipping {extr_team.get("school")} due to missing mandatory field(s)"
                 )
+                continue
+
+            if extr_team["classification"] not in self.classifications:
+                continue
 
-                Team.model_validate(team)
-                TeamExt.model_validate(team_ext)
-                ops = insert_many_operations(
-                    db_client=db_client,
-                    db=Databases.staging,
-                    entities=(team, team_ext),
-                    do_replace=False,
+            conference = get_or_create_conference(
+                db_client,
+                extr_team.get("conference"),
+                extr_team.get("classification"),
+                operations,
+                reference_data=self.reference_data,
+            )
+            if conference is None:
+                log.warning(
+                    f"TeamDataset: {extr_team.get('school')} has no conference, skipping"
                 )
-                if len(ops) == 2:
-                    operations.extend(ops)
-                    count += 2
-                else:
-                    log.warning(
-                        f"TeamDataset: Failed to create insert operations for team {extr_team.get('school')}"
-                    )
-
-            log.debug(f"TeamDataset: Transformed {count} entities")
-            return True
-        except Exception as e:
-            log.exception("TeamDataset: Exception when transforming: %s" % e)
-            return False
+                continue
+
+            venue = get_or_create_venue(
+                db_client,
+                extr_team.get("location").get("id"),
+                operations,
+                reference_data=self.reference_data,
+            )
+            if venue is None:
+                log.warning(f"TeamDataset: {extr_team.get('school')} has no venue")
+
+            yield Team, {
+                "team_id": extr_team.get("id"),
+                "year": extr_team.get("year"),
+                "school": extr_team.get("school"),
+                "conference_id": conference.conference_id,
+                "classification": extr_team.get("classification"),
+                "division": extr_team.get("division"),
+                "venue_id": venue.venue_id if venue is not None else None,
+            }
+            yield TeamExt, {
+                "team_id": extr_team.get("id"),
+                "year": extr_team.get("year"),
+                "mascot": extr_team.get("mascot"),
+                "abbreviation": extr_team.get("abbreviation"),
+                "alternate_names": extr_team.get("alternateNames"),
+                "color": extr_team.get("color"),
+                "alternate_color": extr_team.get("alternateColor"),
+                "logos": extr_team.get("logos"),
+                "twitter": extr_team.get("twitter"),
+            }
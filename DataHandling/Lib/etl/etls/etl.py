@@ -1,23 +1,58 @@
+import copy
 import logging
+import multiprocessing
+from enum import Enum
 from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import batched
 from math import e, prod
-from typing import Callable, Iterable
+from typing import Any, Callable, Iterable, Iterator, Optional
 from venv import create
 
 from pydantic_mongo import AbstractRepository
 
 from pymongo import InsertOne, ReplaceOne
+from bson import ObjectId
 from pymongo.client_session import ClientSession
 from timer import Timer
+from memory_monitor import MemoryMonitor
 from db.db_connection import *
 from db.model.cfb_model import CfbBaseModel
 from db.db_cleanup import *
+from db.db_index_setup import EphemeralIndexes, ensure_unique_index
 from db.db_utility import *
-from etl.cfbd_connection import CfbdConnection
+from db.db_utility import _WriteOp
+from etl.cfbd_archive import CfbdMode
+from etl.cfbd_connection import CfbdConnection, api_stats, cfbd_host
+from etl.extraction_manifest import ExtractionManifest
+from etl.load_checkpoint import LoadCheckpoint, get_unfinished_loads
+from etl.reference_data import ReferenceDataCache
+from etl.partitioned_transform import init_worker, merge_partition, transform_partition
+from etl.dataset_scheduler import DataSetScheduler
+from etl.datasets.dataset_utility import stage_records, transform_batch_size
+from etl.datasets.aggregation_utility import validate_staging
 
 log = logging.getLogger("CfbStats.etl.etls")
 
 
+class TransformMode(Enum):
+    python = "python"
+    aggregation = "aggregation"
+
+
+class LoadMode(Enum):
+    """
+    How staged entities are loaded into production. Merge loads run inside MongoDB and
+    cannot compute fingerprints, so the documents they write have none. Later entities
+    and raw loads compute the fingerprints of those documents from their content, which
+    reads them in full until they are replaced.
+    """
+
+    entities = "entities"
+    raw = "raw"
+    merge = "merge"
+
+
 class EtlBase(ABC):
     """
     Abstract ETL tool for moving data from external sources to the DB.
@@ -32,9 +67,33 @@ class EtlBase(ABC):
         clean_extract: bool = True,
         clean_staging: bool = True,
         test_mode: bool = False,
+        parallel_extract: bool = True,
+        parallel_transform: bool = True,
+        use_cache: bool = True,
+        incremental: bool = True,
+        cfbd_mode: CfbdMode = CfbdMode.live,
+        cfbd_archive: Optional[str] = None,
+        cfbd_host: str = cfbd_host,
+        transform_workers: int = 1,
+        transform_mode: TransformMode = TransformMode.python,
+        load_mode: LoadMode = LoadMode.entities,
+        load_chunk_size: Optional[int] = None,
     ):
         """
         Implementations must set 'extract_datasets' and 'datasets' variables.
+
+        'cfbd_mode' can record CFBD responses to, or replay them from, the
+        'cfbd_archive' file so runs can be benchmarked offline against identical inputs.
+        'cfbd_host' can point the extraction at another server, like the local stand-in.
+        With 'parallel_transform', datasets are transformed concurrently as soon as the
+        datasets they depend on are done. With more than one 'transform_workers',
+        datasets that can be partitioned are transformed by a pool of that many
+        processes. In aggregation 'transform_mode', datasets that provide aggregation
+        pipelines are transformed inside MongoDB.
+        In raw 'load_mode', staged documents are copied to production without creating
+        entities from them, and in merge 'load_mode' they are merged inside MongoDB.
+        With a 'load_chunk_size', the load commits transactions of that many operations
+        and can be resumed after a failure with 'resume_load'.
         """
         self.name = name
         self.extract_datasets: set[ExtractionDataSet] = set()
@@ -44,27 +103,53 @@ class EtlBase(ABC):
         self.clean_extract = clean_extract
         self.clean_staging = clean_staging
         self.test_mode = test_mode
+        self.parallel_extract = parallel_extract
+        self.parallel_transform = parallel_transform
+        self.use_cache = use_cache
+        self.incremental = incremental
+        self.cfbd_mode = cfbd_mode
+        self.cfbd_archive = cfbd_archive
+        self.cfbd_host = cfbd_host
+        self.transform_workers = transform_workers
+        self.transform_mode = transform_mode
+        self.load_mode = load_mode
+        self.load_chunk_size = load_chunk_size
+        self.unchanged_writes = 0
+        self.unchanged_bytes = 0
+        self.manifest: Optional[ExtractionManifest] = None
+        self.extraction_indexes: Optional[EphemeralIndexes] = None
+        self.staging_indexes: Optional[EphemeralIndexes] = None
 
     def run_etl(self):
         log.info(f"Running {self.name} ETL tool")
         etl_timer = Timer(self.name)
 
         self.calculate_datasets()
+        api_stats.reset()
 
-        with CfbdConnection() as cfbd_client, DbConnection(self.test_mode) as db_client:
+        with CfbdConnection(
+            self.use_cache, self.cfbd_mode, self.cfbd_archive, self.cfbd_host
+        ) as cfbd_client, DbConnection(self.test_mode) as db_client:
 
             # External data -> Extraction DB
-            extract_success = Timer("Extraction").run(
-                lambda: self.extract(cfbd_client, db_client)
+            extract_success = self.run_phase(
+                "Extraction", lambda: self.extract(cfbd_client, db_client)
             )
+            api_stats.log_stats()
+            if cfbd_client.cache is not None:
+                cfbd_client.cache.log_stats()
+
             if not extract_success:
                 log.error("Extraction failed. Cancelling remaining ETL steps.")
                 self.cleanup_extraction(db_client)
                 return
 
+            self.extraction_indexes = EphemeralIndexes(db_client, Databases.extraction)
+            self.extraction_indexes.create()
+
             # Extraction DB -> Staging DB
-            transform_success = Timer("Transformation").run(
-                lambda: self.transform(db_client)
+            transform_success = self.run_phase(
+                "Transformation", lambda: self.transform(db_client)
             )
             if not transform_success:
                 log.error("Transformation failed. Cancelling remaining ETL steps.")
@@ -74,8 +159,8 @@ class EtlBase(ABC):
 
             # Additional transformations
             log.info("Running post transformation")
-            post_transform_success = Timer("Post Transformation").run(
-                lambda: self.post_transform(db_client)
+            post_transform_success = self.run_phase(
+                "Post Transformation", lambda: self.post_transform(db_client)
             )
 
             if not post_transform_success:
@@ -88,23 +173,36 @@ class EtlBase(ABC):
 
             # Validate Staging DB
             log.info("Running validation")
-            validated = Timer("Validation").run(lambda: self.validate(db_client))
+            validated = self.run_phase("Validation", lambda: self.validate(db_client))
             if not validated:
                 log.error("Validation failed. Cancelling remaining ETL steps.")
                 self.cleanup_staging(db_client)
                 return
 
             # Staging DB to Presentation DB
-            with db_client.start_session() as session:
-                timer = Timer("Loading")
-                session.with_transaction(lambda s: self.load(s, db_client))
-                timer.stop_and_log()
+            if not self.run_phase("Loading", lambda: self.run_load(db_client)):
+                if self.is_chunked_load():
+                    log.error(
+                        "Loading failed. Staging is kept, so the load can continue with 'resume_load'."
+                    )
+                else:
+                    log.error("Loading failed. Cancelling remaining ETL steps.")
+                    self.cleanup_staging(db_client)
+                return
+
+            if self.manifest is not None:
+                self.manifest.commit()
 
             self.cleanup_staging(db_client)
 
         log.debug(etl_timer.stop())
         log.info(f"Finished running {self.name} ETL tool")
 
+    def run_phase(self, name: str, func: Callable[[], Any]) -> Any:
+        """Runs a phase of the ETL and logs its run time and peak memory."""
+        with MemoryMonitor(name):
+            return Timer(name).run(func)
+
     def extract(self, cfbd_client: CfbdConnection, db_client: DbConnection) -> bool:
         """
         Extracts datasets from CFBD to the extraction DB.
@@ -117,24 +215,59 @@ class EtlBase(ABC):
         self.calculate_datasets()
 
         try:
-            count = 0
-            operations: list = []
-            for ds in self.extract_datasets:
-                count += 1
-                log.info(
-                    f"Extracting {type(ds).__name__} ({count}/{len(self.extract_datasets)})"
-                )
-                success = ds.extract(cfbd_client, db_client, operations)
+            datasets = list(self.extract_datasets)
+            if self.incremental:
+                self.manifest = ExtractionManifest(db_client)
+            for ds in datasets:
+                ds.manifest = self.manifest
+
+            if self.parallel_extract and len(datasets) > 1:
+                log.info(f"Extracting {len(datasets)} datasets in parallel")
+                with ThreadPoolExecutor(max_workers=len(datasets)) as executor:
+                    results = list(
+                        executor.map(
+                            lambda ds: self.extract_dataset(ds, cfbd_client, db_client),
+                            datasets,
+                        )
+                    )
+            else:
+                results = []
+                for count, ds in enumerate(datasets, start=1):
+                    log.info(
+                        f"Extracting {type(ds).__name__} ({count}/{len(datasets)})"
+                    )
+                    results.append(self.extract_dataset(ds, cfbd_client, db_client))
+                    if not results[-1]:
+                        break
+
+            for ds, success in zip(datasets, results):
                 if not success:
+                    log.error(f"Extraction of {type(ds).__name__} failed")
                     return False
-
-            db_client.bulk_write(operations)
         except Exception as e:
             log.exception(f"Error during extraction: {e}")
             return False
 
         return True
 
+    def extract_dataset(
+        self,
+        ds: "ExtractionDataSet",
+        cfbd_client: CfbdConnection,
+        db_client: DbConnection,
+    ) -> bool:
+        """
+        Extracts a single dataset, streaming its operations through its own write buffer.
+        """
+        with WriteBuffer(db_client, name=type(ds).__name__) as operations:
+            success = Timer(f"Extracting {type(ds).__name__}").run(
+                lambda: ds.extract(cfbd_client, db_client, operations)
+            )
+            if not success:
+                operations.discard()
+        operations.log_stats()
+        return success
+
     def transform(self, db_client: DbConnection) -> bool:
         """
         Transforms extraction data and loads it into the staging DB.
@@ -142,22 +275,190 @@ class EtlBase(ABC):
         log.info("Running transformation for %i datasets" % len(self.datasets))
         self.calculate_datasets()
 
+        reference_data = None
         try:
-            count = 0
-            operations: list = []
+            # Staging kept for 'resume_load' must not be mixed with new data, and its
+            # checkpoints must not skip any of it
+            unfinished_loads = get_unfinished_loads(db_client)
+            if len(unfinished_loads) > 0:
+                log.warning(
+                    f"Discarding staging and the checkpoints of the unfinished loads of {unfinished_loads}"
+                )
+                cleanup_staging_collections(db_client)
+
+            # Staging is queried between the flushes of the transformation itself,
+            # so its indexes are created before the first write. Aggregation pipelines
+            # merge on the model keys, which needs unique indexes on them.
+            self.staging_indexes = EphemeralIndexes(
+                db_client,
+                Databases.staging,
+                unique_keys=self.transform_mode is TransformMode.aggregation,
+            )
+            self.staging_indexes.create()
+
+            # Reference data is only read by the transformation, so it lives until the
+            # transformation of this run ends
+            reference_data = ReferenceDataCache(db_client)
             for ds in self.datasets:
-                count += 1
-                log.info(
-                    f"Transforming {type(ds).__name__} ({count}/{len(self.datasets)})"
+                ds.reference_data = reference_data
+
+            scheduler = DataSetScheduler(
+                self.datasets,
+                max_workers=len(self.datasets) if self.parallel_transform else 1,
+                extra_dependencies=self.get_transform_conflicts(),
+            )
+            with WriteBuffer(db_client, name="Transformation") as operations:
+                success = scheduler.run(
+                    lambda ds: self.transform_dataset(
+                        ds, db_client, operations, reference_data
+                    )
                 )
-                success = ds.transform(db_client, operations)
+                scheduler.log_report()
                 if not success:
+                    operations.discard()
                     return False
-
-            db_client.bulk_write(operations)
+            operations.log_stats()
         except Exception as e:
             log.exception(f"Error during transformation: {e}")
             return False
+        finally:
+            if reference_data is not None:
+                reference_data.log_stats()
+                reference_data.invalidate()
+            for ds in self.datasets:
+                ds.reference_data = None
+        return True
+
+    def get_transform_conflicts(self) -> dict["DataSet", set["DataSet"]]:
+        """
+        Returns the datasets each dataset has to wait for besides its dependencies.
+        Aggregation pipelines only see the entities in staging, so datasets producing the
+        same models run in list order in aggregation mode. Otherwise the pending entities
+        of the shared write buffer keep concurrent datasets from creating duplicates.
+        """
+        if self.transform_mode is not TransformMode.aggregation:
+            return {}
+
+        return {
+            ds: {
+                upstream
+                for upstream in self.datasets[:index]
+                if not upstream.models.keys().isdisjoint(ds.models)
+            }
+            for index, ds in enumerate(self.datasets)
+        }
+
+    def transform_dataset(
+        self,
+        ds: "DataSet",
+        db_client: DbConnection,
+        operations: WriteBuffer,
+        reference_data: ReferenceDataCache,
+    ) -> bool:
+        """
+        Transforms a single dataset with aggregation pipelines, a process pool or in this
+        process, and logs how long it took including its writes.
+        """
+        pipelines = []
+        if self.transform_mode is TransformMode.aggregation:
+            # Pipelines are built from and check staging, so the entities of earlier
+            # datasets must be written first
+            operations.flush()
+            pipelines = ds.get_aggregation_pipelines(db_client)
+        partitions = (
+            ds.get_transform_partitions(db_client)
+            if len(pipelines) == 0 and self.transform_workers > 1
+            else []
+        )
+
+        log.info(f"Transforming {type(ds).__name__}")
+        timer = Timer(type(ds).__name__)
+        if len(pipelines) > 0:
+            mode = TransformMode.aggregation.value
+            success = self.transform_aggregation(ds, db_client, pipelines)
+        elif len(partitions) > 1:
+            mode = f"{self.transform_workers} workers"
+            success = self.transform_partitions(
+                ds, partitions, operations, reference_data
+            )
+        else:
+            mode = TransformMode.python.value
+            success = ds.transform(db_client, operations)
+
+        if success:
+            operations.flush()
+        log.info(
+            f"Transformed {type(ds).__name__} ({mode}) in {timer.get_elapsed_time():.2f} seconds"
+        )
+        return success
+
+    def transform_aggregation(
+        self,
+        ds: "DataSet",
+        db_client: DbConnection,
+        pipelines: list[tuple[ExtractionCollections, list[dict]]],
+    ) -> bool:
+        """
+        Runs the aggregation pipelines of a dataset, then validates the staged documents
+        of its models, since staging is read back without validation.
+        """
+        name = type(ds).__name__
+        try:
+            for coll, pipeline in pipelines:
+                db_client.get_cfb_collection(Databases.extraction, coll).aggregate(
+                    pipeline
+                )
+
+            for model in ds.models:
+                count = validate_staging(db_client, model)
+                log.debug(f"{name}: Validated {count} staged {model.model_id()} entities")
+            return True
+        except Exception as e:
+            log.exception(f"{name}: Exception during aggregation: {e}")
+            return False
+
+    def transform_partitions(
+        self,
+        ds: "DataSet",
+        partitions: list[dict],
+        operations: WriteBuffer,
+        reference_data: ReferenceDataCache,
+    ) -> bool:
+        """
+        Transforms the partitions of a dataset in a process pool. Every worker opens its
+        own DB connection, and the results are written through the staging write buffer
+        in partition order.
+        """
+        log.info(
+            f"Transforming {len(partitions)} partitions of {type(ds).__name__} with {self.transform_workers} workers"
+        )
+
+        # Workers only transform, so the extraction datasets and run caches stay here
+        worker_ds = copy.copy(ds)
+        worker_ds.extract_datasets = set()
+        worker_ds.reference_data = None
+
+        count = 0
+        # Other datasets may be running in threads, which must not be forked
+        with ProcessPoolExecutor(
+            max_workers=self.transform_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(self.test_mode, reference_data),
+        ) as executor:
+            futures = [
+                executor.submit(transform_partition, worker_ds, partition)
+                for partition in partitions
+            ]
+            for future in futures:
+                results = future.result()
+                if results is None:
+                    for f in futures:
+                        f.cancel()
+                    return False
+                count += merge_partition(results, operations)
+
+        log.debug(f"{type(ds).__name__}: Merged {count} entities from {len(partitions)} partitions")
         return True
 
     @abstractmethod
@@ -178,6 +479,10 @@ class EtlBase(ABC):
         """
         Cleans up datasets in the extraction DB.
         """
+        if self.extraction_indexes is not None:
+            self.extraction_indexes.log_report()
+            self.extraction_indexes = None
+
         if not self.clean_extract:
             log.info("Skipping extraction cleanup")
             return
@@ -187,74 +492,360 @@ class EtlBase(ABC):
             lambda: cleanup_extraction_collections(db_client)
         )
 
+    def run_load(self, db_client: DbConnection) -> bool:
+        """
+        Loads data from the staging DB into the production DB with the configured load
+        mode, in chunks if a 'load_chunk_size' is set and in a single transaction otherwise.
+        """
+        if self.load_mode is LoadMode.merge:
+            return self.load_merge(db_client)
+
+        if self.is_chunked_load():
+            return self.load_chunks(db_client)
+
+        try:
+            with db_client.start_session() as session:
+                session.with_transaction(lambda s: self.load(s, db_client))
+        except Exception as e:
+            log.error(f"Loading transaction aborted: {e}")
+            return False
+        return True
+
     def load(self, session: ClientSession, db_client: DbConnection):
         """
-        Loads data from the staging DB into the production DB.
+        Loads data from the staging DB into the production DB. Errors are raised, so the
+        transaction of 'session' is aborted or retried.
         """
         log.info("Running loading for %i models" % len(self.models))
         self.calculate_datasets()
 
+        self.unchanged_writes = self.unchanged_bytes = 0
+        operations = WriteBuffer(db_client, name="Loading", session=session)
         try:
-            operations: list = []
             for model in self.models:
-                stage_repository: AbstractRepository = db_client.get_cfb_repository(
-                    Databases.staging, model
-                )
-                prod_repository: AbstractRepository = db_client.get_cfb_repository(
-                    Databases.production, model
-                )
+                for doc_id, op in self.get_load_operations(db_client, model):
+                    operations.append(op)
 
-                stage_entities: list[CfbBaseModel] = list(stage_repository.find_by({}))
-                if len(stage_entities) == 0:
-                    log.warning(
-                        f"No entities found in staging for model {model.__name__}, skipping load"
-                    )
-                    continue
+            operations.flush()
+        except Exception as e:
+            log.exception(f"Error during loading: {e}")
+            raise
 
-                prod_entities: Iterable[CfbBaseModel] = prod_repository.find_by({})
+        log.info(
+            f"Loaded {operations.written_operations} entities into the production DB"
+        )
+        operations.log_stats()
+        self.log_unchanged_writes()
 
-                for entity in stage_entities:
-                    op = None
+    def load_chunks(self, db_client: DbConnection) -> bool:
+        """
+        Loads data from the staging DB into the production DB in transactions of
+        'load_chunk_size' operations. Every chunk records its progress in the load
+        checkpoint within its transaction, so after a failure the load resumes at the
+        next uncommitted chunk. A transient error only retries its own chunk.
+        """
+        log.info(
+            f"Running loading for {len(self.models)} models in chunks of {self.load_chunk_size}"
+        )
+        self.calculate_datasets()
 
-                    if self.models[model]:
-                        op = insert_one_operation(
-                            db_client=db_client,
-                            db=Databases.production,
-                            entity=entity,
-                            do_replace=True,
-                        )
+        checkpoint = LoadCheckpoint(db_client, self.name)
+        self.unchanged_writes = self.unchanged_bytes = 0
+        latencies: list[float] = []
+        try:
+            with db_client.start_session() as session:
+                for model in self.models:
+                    if checkpoint.is_completed(model):
+                        log.info(f"{model.__name__}: already loaded, skipping")
+                        continue
 
-                    else:
-                        prod_entity = next(
-                            (e for e in prod_entities if e == entity), None
+                    operations = self.get_load_operations(
+                        db_client, model, checkpoint.get_last_id(model)
+                    )
+                    for chunk in batched(operations, self.load_chunk_size):
+                        timer = Timer(f"{model.__name__} chunk")
+                        session.with_transaction(
+                            lambda s: self.write_chunk(
+                                s, db_client, model, chunk, checkpoint
+                            )
                         )
-                        if prod_entity is not None:
-                            continue
-
-                        op = insert_one_operation(
-                            db_client=db_client,
-                            db=Databases.production,
-                            entity=entity,
-                            do_replace=False,
+                        latencies.append(timer.get_elapsed_time())
+                        log.debug(
+                            f"{model.__name__}: committed {len(chunk)} operations in {latencies[-1]:.2f} seconds"
                         )
 
-                    if op is not None:
-                        operations.append(op)
-                    else:
-                        log.warning(
-                            f"Failed to create insert operation for entity {entity}"
-                        )
+                    checkpoint.complete(model)
+
+            checkpoint.clear()
+        except Exception as e:
+            log.exception(f"Error during loading: {e}")
+            return False
+        finally:
+            if len(latencies) > 0:
+                log.info(
+                    f"Committed {len(latencies)} chunks in {sum(latencies):.2f} seconds, "
+                    f"{sum(latencies) / len(latencies):.3f} seconds per chunk on average "
+                    f"and {max(latencies):.3f} at most"
+                )
+            self.log_unchanged_writes()
+
+        return True
+
+    def load_merge(self, db_client: DbConnection) -> bool:
+        """
+        Loads data from the staging DB into the production DB with a '$merge' aggregation
+        per model on its key fields, so no documents pass through this process. Override
+        models replace the matching production entities, other models only insert the
+        missing ones. '$merge' needs a unique index on the key fields in production,
+        which is created if it is missing. Aggregations with '$merge' cannot run in a
+        transaction.
+        """
+        log.info(f"Running merge loading for {len(self.models)} models")
+        self.calculate_datasets()
+
+        prod_db_name = db_client.get_cfb_database(Databases.production).name
+        try:
+            for model in self.models:
+                stage_coll = db_client.get_cfb_collection(Databases.staging, model)
+                prod_coll = db_client.get_cfb_collection(Databases.production, model)
+                keys = list(model.model_keys())
+                try:
+                    ensure_unique_index(prod_coll, keys)
+                except Exception as e:
+                    log.error(
+                        f"{model.__name__}: merge loading needs a unique index on {keys} in production, "
+                        f"which could not be created: {e}"
+                    )
+                    return False
 
-            db_client.bulk_write(operations, session=session)
+                prod_count = prod_coll.count_documents({})
+                timer = Timer(model.__name__)
+                stage_coll.aggregate(
+                    [
+                        # Matched production entities keep their ids
+                        {"$unset": "_id"},
+                        {
+                            "$merge": {
+                                "into": {"db": prod_db_name, "coll": model.model_id()},
+                                "on": keys,
+                                "whenMatched": (
+                                    "replace" if self.models[model] else "keepExisting"
+                                ),
+                                "whenNotMatched": "insert",
+                            }
+                        },
+                    ]
+                )
+                log.info(
+                    f"{model.__name__}: merged {stage_coll.count_documents({})} staged entities, "
+                    f"{prod_coll.count_documents({}) - prod_count} inserted, "
+                    f"in {timer.get_elapsed_time():.2f} seconds"
+                )
         except Exception as e:
             log.exception(f"Error during loading: {e}")
+            return False
+
+        return True
+
+    def write_chunk(
+        self,
+        session: ClientSession,
+        db_client: DbConnection,
+        model: type[CfbBaseModel],
+        chunk: tuple[tuple[ObjectId, _WriteOp], ...],
+        checkpoint: LoadCheckpoint,
+    ):
+        db_client.bulk_write([op for doc_id, op in chunk], session=session)
+        checkpoint.save(session, model, chunk[-1][0])
+
+    def is_chunked_load(self) -> bool:
+        return self.load_chunk_size is not None and self.load_mode is not LoadMode.merge
+
+    def resume_load(self) -> bool:
+        """
+        Continues a chunked load that failed from its checkpoint, and cleans up staging
+        once everything is loaded.
+        """
+        if not self.is_chunked_load():
+            log.error("Only chunked loads can be resumed, 'load_chunk_size' is not set")
+            return False
+
+        with DbConnection(self.test_mode) as db_client:
+            if not self.run_phase("Loading", lambda: self.load_chunks(db_client)):
+                return False
+            self.cleanup_staging(db_client)
+        return True
+
+    def get_load_operations(
+        self,
+        db_client: DbConnection,
+        model: type[CfbBaseModel],
+        after_id: Optional[ObjectId] = None,
+    ) -> Iterator[tuple[ObjectId, _WriteOp]]:
+        """
+        Yields the production write operations of the staged documents of a model in the
+        order of their ids, with the id of the staged document. With an 'after_id', only
+        documents after it are loaded.
+        """
+        stage_coll = db_client.get_cfb_collection(Databases.staging, model)
+        if stage_coll.find_one({}, {"_id": 1}) is None:
+            log.warning(
+                f"No entities found in staging for model {model.__name__}, skipping load"
+            )
+            return iter(())
+
+        if after_id is not None:
+            log.info(f"{model.__name__}: resuming load after staged document {after_id}")
+
+        stage_docs = stage_coll.find(
+            {} if after_id is None else {"_id": {"$gt": after_id}},
+            batch_size=transform_batch_size,
+        ).sort("_id", 1)
+
+        if self.models[model]:
+            return self.generate_replace_operations(db_client, model, stage_docs)
+        return self.generate_missing_operations(db_client, model, stage_docs)
+
+    def generate_replace_operations(
+        self,
+        db_client: DbConnection,
+        model: type[CfbBaseModel],
+        stage_docs: Iterable[dict],
+    ) -> Iterator[tuple[ObjectId, _WriteOp]]:
+        """
+        Replaces or inserts the staged entities of a model in production, unless the
+        production entity has the same fingerprint. Only the key fields and fingerprints
+        of production are read, except for entities without a fingerprint, like those
+        of a merge load, whose fingerprint is computed from their content.
+        """
+        prod_coll = db_client.get_cfb_collection(Databases.production, model)
+
+        keys = model.model_keys()
+        prod_fingerprints = {
+            tuple(doc.get(key) for key in keys): doc.get(fingerprint_field)
+            for doc in prod_coll.find(
+                {fingerprint_field: {"$exists": True}},
+                {"_id": 0, fingerprint_field: 1, **{key: 1 for key in keys}},
+            )
+        }
+        for doc in prod_coll.find({fingerprint_field: {"$exists": False}}):
+            prod_fingerprints[tuple(doc.get(key) for key in keys)] = get_fingerprint(doc)
+
+        replaced = unchanged = unchanged_bytes = 0
+        for doc in stage_docs:
+            doc_id = doc["_id"]
+            key = tuple(doc.get(key) for key in keys)
+            op = self.get_load_operation(db_client, model, doc, do_replace=True)
+            if op is None:
+                continue
+
+            if prod_fingerprints.get(key) == op._doc[fingerprint_field]:
+                unchanged += 1
+                unchanged_bytes += get_operation_size(op)
+                continue
+
+            yield doc_id, op
+            replaced += 1
+
+        self.unchanged_writes += unchanged
+        self.unchanged_bytes += unchanged_bytes
+        log.info(
+            f"{model.__name__}: replaced {replaced} entities in production, skipped {unchanged} "
+            f"unchanged entities ({unchanged_bytes / (1024 * 1024):.2f} MB)"
+        )
+
+    def generate_missing_operations(
+        self,
+        db_client: DbConnection,
+        model: type[CfbBaseModel],
+        stage_docs: Iterable[dict],
+    ) -> Iterator[tuple[ObjectId, _WriteOp]]:
+        """
+        Inserts the staged entities of a model whose keys are not in production yet.
+        Only the key fields of production are read, into a set that every staged entity
+        is checked against.
+        """
+        prod_coll = db_client.get_cfb_collection(Databases.production, model)
+
+        keys = model.model_keys()
+        prod_keys = {
+            tuple(doc.get(key) for key in keys)
+            for doc in prod_coll.find({}, {"_id": 0, **{key: 1 for key in keys}})
+        }
 
-        log.info(f"Loaded {len(operations)} entities into the production DB")
+        compared = skipped = inserted = 0
+        for doc in stage_docs:
+            compared += 1
+            key = tuple(doc.get(key) for key in keys)
+            if key in prod_keys:
+                skipped += 1
+                continue
+
+            doc_id = doc["_id"]
+            op = self.get_load_operation(db_client, model, doc, do_replace=False)
+            if op is None:
+                continue
+
+            yield doc_id, op
+            prod_keys.add(key)
+            inserted += 1
+
+        log.info(
+            f"{model.__name__}: compared {compared} staged entities with {len(prod_keys) - inserted} "
+            f"in production, skipped {skipped} and inserted {inserted}"
+        )
+
+    def get_load_operation(
+        self,
+        db_client: DbConnection,
+        model: type[CfbBaseModel],
+        doc: dict,
+        do_replace: bool,
+    ) -> Optional[_WriteOp]:
+        """
+        Returns the production write operation of a staged document, with the fingerprint
+        of its content. Staging only holds documents of validated entities, so they are
+        not validated again.
+        """
+        if self.load_mode is LoadMode.raw:
+            doc.pop("_id", None)
+            op = insert_one_operation(
+                db_client=db_client,
+                db=Databases.production,
+                entity=doc,
+                do_replace=do_replace,
+                model=model,
+                query={key: doc.get(key) for key in model.model_keys()},
+            )
+        else:
+            op = insert_one_operation(
+                db_client=db_client,
+                db=Databases.production,
+                entity=model.from_trusted(doc),
+                do_replace=do_replace,
+            )
+
+        if op is None:
+            log.warning(f"Failed to create insert operation for {model.__name__} {doc}")
+            return None
+
+        op._doc[fingerprint_field] = get_fingerprint(op._doc)
+        return op
+
+    def log_unchanged_writes(self):
+        log.info(
+            f"Skipped {self.unchanged_writes} writes of unchanged entities, saving "
+            f"{self.unchanged_bytes / (1024 * 1024):.2f} MB of writes"
+        )
 
     def cleanup_staging(self, db_client: DbConnection):
         """
         Cleans up datasets in the staging DB.
         """
+        if self.staging_indexes is not None:
+            self.staging_indexes.log_report()
+            self.staging_indexes = None
+
         if not self.clean_staging:
             log.info("Skipping staging cleanup")
             return
@@ -276,8 +867,10 @@ class EtlBase(ABC):
 
         for ds in self.datasets:
             for dataset in ds.extract_datasets:
-                if not any(isinstance(d, type(dataset)) for d in self.extract_datasets):
-                    self.extract_datasets.add(dataset)
+                # Merge the parameters of datasets of the same type into a single plan.
+                # The DataSet's own instance is copied so it is not modified.
+                if not any(d.merge(dataset) for d in self.extract_datasets):
+                    self.extract_datasets.add(copy.copy(dataset))
 
             self.models.update(ds.models)
             for model in ds.models:
@@ -286,6 +879,24 @@ class EtlBase(ABC):
                 elif ds.models[model] and not self.models[model]:
                     self.models[model] = True
 
+        self.log_extraction_plan()
+
+    def log_extraction_plan(self):
+        """
+        Logs the API calls planned by the extraction datasets. Partitions that are
+        finalized in the extraction manifest will be skipped, so this is an upper bound.
+        """
+        plans = {type(ds).__name__: ds.get_call_plan() for ds in self.extract_datasets}
+        call_count = sum(len(calls) for calls in plans.values())
+
+        log.info(
+            f"Extraction plan: {len(plans)} datasets, up to {call_count} API calls"
+        )
+        for name, calls in sorted(plans.items()):
+            log.info(f"  {name}: {len(calls)} calls")
+            for call in calls:
+                log.debug(f"    {call}")
+
 
 class DataSet(ABC):
     """
@@ -295,14 +906,71 @@ class DataSet(ABC):
     """
 
     def __init__(self):
-        """Parameters should be required and passed down from the calling ETL."""
+        """
+        Parameters should be required and passed down from the calling ETL.
+
+        'models' are the models the dataset produces, and 'depends_on' the types of the
+        datasets that have to be transformed first.
+        """
         self.extract_datasets: set[ExtractionDataSet] = set()
         self.models: dict[type[CfbBaseModel], bool] = {}
+        self.depends_on: set[type[DataSet]] = set()
+        self.reference_data: Optional[ReferenceDataCache] = None
+        self.partition: Optional[dict] = None
+
+    def transform(self, db_client: DbConnection, operations: WriteBuffer) -> bool:
+        """
+        Transforms the extraction data, or only the data matching 'partition' if it is set.
+        Records yielded by 'generate_entities' are validated and staged in batches of
+        every model, so only one batch per model is held while the generator is paused.
+        """
+        name = type(self).__name__
+        try:
+            count = 0
+            batches: dict[type[CfbBaseModel], list] = {}
+            for model, record in self.generate_entities(db_client, operations):
+                batch = batches.setdefault(model, [])
+                batch.append(record)
+                if len(batch) >= transform_batch_size:
+                    count += stage_records(db_client, model, batch, operations)
+                    batches[model] = []
+
+            for model, batch in batches.items():
+                count += stage_records(db_client, model, batch, operations)
+            log.debug(f"{name}: Transformed {count} entities")
+            return True
+        except Exception as e:
+            log.exception(f"{name}: Exception during transform: {e}")
+            return False
 
     @abstractmethod
-    def transform(self, db_client: DbConnection, operations: list) -> bool:
+    def generate_entities(
+        self, db_client: DbConnection, operations: WriteBuffer
+    ) -> Iterator[tuple[type[CfbBaseModel], dict | CfbBaseModel]]:
+        """
+        Lazily yields the staging entities of the transformation with their models, as
+        records or validated entities. Referenced entities that are created on the way,
+        like venues, are written through 'operations' directly.
+        """
         pass
 
+    def get_transform_partitions(self, db_client: DbConnection) -> list[dict]:
+        """
+        Returns extraction query filters that split the transformation into independent
+        partitions. Datasets that cannot be partitioned return an empty list.
+        """
+        return []
+
+    def get_aggregation_pipelines(
+        self, db_client: DbConnection
+    ) -> list[tuple[ExtractionCollections, list[dict]]]:
+        """
+        Returns aggregation pipelines, with the extraction collection each runs on, that
+        perform the transformation inside MongoDB and produce the same staging entities
+        as 'transform'. Datasets without pipelines return an empty list.
+        """
+        return []
+
 
 class ExtractionDataSet(ABC):
     """
@@ -313,10 +981,50 @@ class ExtractionDataSet(ABC):
 
     def __init__(self):
         """Parameters should be required and passed down from the calling DataSet."""
-        pass
+        self.manifest: Optional[ExtractionManifest] = None
+
+    def merge(self, other: "ExtractionDataSet") -> bool:
+        """
+        Merges the parameters of another dataset of the same type into this one so a
+        single extraction covers both. Returns False if the datasets cannot be merged.
+        """
+        return False
+
+    def get_call_plan(self) -> list[str]:
+        """Returns a description of each API call this dataset will make."""
+        return [type(self).__name__]
+
+    def get_open_partitions(
+        self,
+        coll: ExtractionCollections,
+        partitions: list[tuple],
+        classifications: list[str],
+    ) -> list[tuple]:
+        """
+        Removes the partitions that are finalized in the extraction manifest for all of
+        the 'classifications'.
+        """
+        if self.manifest is None:
+            return partitions
+
+        open_partitions = [
+            p
+            for p in partitions
+            if not self.manifest.is_finalized(coll, *p, classifications)
+        ]
+        skipped = len(partitions) - len(open_partitions)
+        if skipped > 0:
+            log.info(
+                f"{type(self).__name__}: Skipping {skipped}/{len(partitions)} finalized partitions"
+            )
+
+        return open_partitions
 
     @abstractmethod
     def extract(
-        self, cfbd_client: CfbdConnection, db_client: DbConnection, operations: list
+        self,
+        cfbd_client: CfbdConnection,
+        db_client: DbConnection,
+        operations: WriteBuffer,
     ) -> bool:
         pass
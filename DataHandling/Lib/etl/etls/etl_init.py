@@ -24,6 +24,7 @@ class EtlInit(EtlBase):
         years: list[str] = [2023, 2024, 2025],
         classifications: list[str] = ["fbs", "fcs"],
         test_mode: bool = False,
+        **kwargs,
     ):
 
         super().__init__(
@@ -32,6 +33,7 @@ class EtlInit(EtlBase):
             clean_extract=clean_extract,
             clean_staging=clean_staging,
             test_mode=test_mode,
+            **kwargs,
         )
 
         weeks = list(range(1, 17))
@@ -21,6 +21,7 @@ class EtlSeasonStart(EtlBase):
         years: list[str] = [2026],
         classifications: list[str] = ["fbs", "fcs"],
         test_mode: bool = False,
+        **kwargs,
     ):
 
         super().__init__(
@@ -29,6 +30,7 @@ class EtlSeasonStart(EtlBase):
             clean_extract=clean_extract,
             clean_staging=clean_staging,
             test_mode=test_mode,
+            **kwargs,
         )
 
         weeks = list(range(1, 17))
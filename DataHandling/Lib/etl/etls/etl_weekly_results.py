@@ -25,6 +25,7 @@ class EtlWeeklyResults(EtlBase):
         clean_extract: bool = True,
         clean_staging: bool = True,
         test_mode: bool = False,
+        **kwargs,
     ):
 
         super().__init__(
@@ -33,6 +34,7 @@ class EtlWeeklyResults(EtlBase):
             clean_extract=clean_extract,
             clean_staging=clean_staging,
             test_mode=test_mode,
+            **kwargs,
         )
 
         self.year = year
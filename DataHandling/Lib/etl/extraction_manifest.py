@@ -0,0 +1,161 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+
+from pymongo import ReplaceOne
+
+from db.db_connection import DbConnection, Databases, ExtractionCollections
+from db.model.game import SeasonType, current_season
+
+log = logging.getLogger("CfbStats.etl")
+
+_PartitionKey = tuple[str, int, int, str]
+
+
+class ExtractionManifest:
+    """
+    Records which (year, week, season type) partitions have been extracted into each
+    extraction collection, and for which classifications. A partition is finalized once
+    all of its games are completed, and finalized partitions are skipped by later
+    extractions of the same or fewer classifications.
+
+    Records are only written by 'commit', which should be called after the extracted
+    data has been loaded into production.
+    """
+
+    def __init__(self, db_client: DbConnection):
+        self.coll = db_client.get_cfb_collection(
+            Databases.extraction, ExtractionCollections.manifest
+        )
+        self.lock = threading.Lock()
+        self.records: dict[_PartitionKey, dict] = {}
+        self.finalized: dict[_PartitionKey, list[frozenset[str]]] = {}
+
+        # Records without classifications predate them and cover an unknown filter
+        for doc in self.coll.find(
+            {"completed": True, "classifications": {"$exists": True}}
+        ):
+            key = self.get_key(
+                ExtractionCollections(doc["collection"]),
+                doc["year"],
+                doc["week"],
+                SeasonType(doc["season_type"]),
+            )
+            self.finalized.setdefault(key, []).append(frozenset(doc["classifications"]))
+
+    def get_key(
+        self,
+        coll: ExtractionCollections,
+        year: int,
+        week: int,
+        season_type: SeasonType,
+    ) -> _PartitionKey:
+        return (coll.value, year, week, season_type.value)
+
+    def is_finalized(
+        self,
+        coll: ExtractionCollections,
+        year: int,
+        week: int,
+        season_type: SeasonType,
+        classifications: list[str],
+    ) -> bool:
+        """
+        A partition is finalized for the classifications if it was finalized by an
+        extraction of all of them.
+        """
+        return any(
+            covered.issuperset(classifications)
+            for covered in self.finalized.get(
+                self.get_key(coll, year, week, season_type), []
+            )
+        )
+
+    def record(
+        self,
+        coll: ExtractionCollections,
+        year: int,
+        week: int,
+        season_type: SeasonType,
+        count: int,
+        classifications: list[str],
+        completed: Optional[bool] = None,
+    ):
+        """
+        Records a partition extracted for the given classifications. If 'completed' is
+        None, the partition is finalized together with the game partition of the same
+        year, week and season type.
+        """
+        key = self.get_key(coll, year, week, season_type)
+        with self.lock:
+            self.records[key] = {
+                "collection": coll.value,
+                "year": year,
+                "week": week,
+                "season_type": season_type.value,
+                "classifications": sorted(classifications),
+                "count": count,
+                "completed": completed,
+                "fetched_at": datetime.now(timezone.utc),
+            }
+
+    def commit(self):
+        """Writes the recorded partitions to the manifest."""
+        with self.lock:
+            records, self.records = self.records, {}
+
+        operations = []
+        for key, record in records.items():
+            if record["completed"] is None:
+                game_key = (ExtractionCollections.game.value, *key[1:])
+                game_record = records.get(game_key)
+                record["completed"] = self.is_finalized(
+                    ExtractionCollections.game,
+                    *key[1:3],
+                    SeasonType(key[3]),
+                    record["classifications"],
+                ) or (
+                    game_record is not None
+                    and game_record["completed"]
+                    and set(game_record["classifications"]).issuperset(
+                        record["classifications"]
+                    )
+                )
+
+            operations.append(
+                ReplaceOne(
+                    {
+                        "collection": record["collection"],
+                        "year": record["year"],
+                        "week": record["week"],
+                        "season_type": record["season_type"],
+                        "classifications": record["classifications"],
+                    },
+                    record,
+                    upsert=True,
+                )
+            )
+
+        if len(operations) == 0:
+            return
+
+        self.coll.bulk_write(operations)
+        finalized = [key for key, record in records.items() if record["completed"]]
+        for key in finalized:
+            self.finalized.setdefault(key, []).append(
+                frozenset(records[key]["classifications"])
+            )
+        log.info(
+            f"Extraction manifest: recorded {len(operations)} partitions, {len(finalized)} finalized"
+        )
+
+
+def is_partition_completed(year: int, games: list) -> bool:
+    """
+    A game partition is completed when all of its games are completed. Partitions of
+    past seasons are always completed, even if they have no games.
+    """
+    if year < current_season():
+        return True
+    return len(games) > 0 and all(game.completed for game in games)
@@ -0,0 +1,78 @@
+import logging
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.client_session import ClientSession
+
+from db.db_connection import DbConnection, Databases, load_checkpoint_collection
+from db.model.cfb_model import CfbBaseModel
+
+log = logging.getLogger("CfbStats.etl")
+
+
+class LoadCheckpoint:
+    """
+    Progress of a chunked load of an ETL, kept in the staging DB next to the data being
+    loaded. Every chunk saves the id of the last staged document it loaded in the same
+    transaction as its writes, so a failed load resumes after the last committed chunk.
+
+    The progress is read once, when the load starts, and cleared after it succeeds or
+    the staging collections are cleaned up. A new transformation cleans up staging if
+    a checkpoint exists, so it only applies to the data staged by the failed run.
+    """
+
+    def __init__(self, db_client: DbConnection, name: str):
+        self.coll = db_client.get_cfb_database(Databases.staging)[
+            load_checkpoint_collection
+        ]
+        self.name = name
+        doc = self.coll.find_one({"_id": name}) or {}
+        self.models: dict[str, dict] = doc.get("models", {})
+        self.chunks: int = doc.get("chunks", 0)
+
+        if self.chunks > 0:
+            log.info(
+                f"Load checkpoint: resuming {name} load after {self.chunks} committed chunks"
+            )
+
+    def get_last_id(self, model: type[CfbBaseModel]) -> Optional[ObjectId]:
+        """Returns the id of the last staged document of a model that was loaded."""
+        return self.models.get(model.model_id(), {}).get("last_id")
+
+    def is_completed(self, model: type[CfbBaseModel]) -> bool:
+        return self.models.get(model.model_id(), {}).get("completed", False)
+
+    def save(
+        self, session: ClientSession, model: type[CfbBaseModel], last_id: ObjectId
+    ):
+        """Saves the progress of a chunk within the transaction of the chunk."""
+        self.coll.update_one(
+            {"_id": self.name},
+            {
+                "$set": {f"models.{model.model_id()}.last_id": last_id},
+                "$inc": {"chunks": 1},
+            },
+            upsert=True,
+            session=session,
+        )
+
+    def complete(self, model: type[CfbBaseModel]):
+        """Marks every staged document of a model as loaded."""
+        self.coll.update_one(
+            {"_id": self.name},
+            {"$set": {f"models.{model.model_id()}.completed": True}},
+            upsert=True,
+        )
+
+    def clear(self):
+        self.coll.delete_one({"_id": self.name})
+
+
+def get_unfinished_loads(db_client: DbConnection) -> list[str]:
+    """Returns the names of the ETLs whose chunked load failed and can be resumed."""
+    return [
+        doc["_id"]
+        for doc in db_client.get_cfb_database(Databases.staging)[
+            load_checkpoint_collection
+        ].find({}, {"_id": 1})
+    ]
@@ -0,0 +1,74 @@
+import logging
+from typing import Optional
+
+from db.db_connection import DbConnection
+from db.db_utility import WriteBuffer, _WriteOp
+from etl.reference_data import ReferenceDataCache
+
+log = logging.getLogger("CfbStats.etl")
+
+# State of a transform worker process, set by 'init_worker'
+worker_db_client: Optional[DbConnection] = None
+worker_reference_data: Optional[ReferenceDataCache] = None
+
+
+class PartitionBuffer(WriteBuffer):
+    """
+    Collects the operations of a partition transformed in a worker process, so the
+    parent process can write them through its own staging write buffer. Entities keep
+    their keys, which lets the parent drop duplicates created by other partitions.
+    """
+
+    def __init__(self):
+        super().__init__(db_client=None, name="Partition")
+        self.results: list[tuple[_WriteOp, Optional[dict], tuple[dict, ...]]] = []
+
+    def append(self, op: _WriteOp):
+        self.results.append((op, None, ()))
+
+    def append_keyed(self, op: _WriteOp, key: dict, *lookup_keys: dict) -> bool:
+        if not self.pending.register(op._namespace, key, op._doc, lookup_keys):
+            return False
+
+        self.results.append((op, key, lookup_keys))
+        return True
+
+    def flush(self):
+        pass
+
+
+def init_worker(test_mode: bool, reference_data: Optional[ReferenceDataCache]):
+    """Opens the DB connection of a worker process and receives the reference data."""
+    global worker_db_client, worker_reference_data
+    worker_db_client = DbConnection(test_mode)
+    worker_reference_data = reference_data
+
+
+def transform_partition(
+    ds, partition: dict
+) -> Optional[list[tuple[_WriteOp, Optional[dict], tuple[dict, ...]]]]:
+    """
+    Transforms one partition of a dataset in a worker process. Returns the collected
+    operations, or None if the transformation failed.
+    """
+    operations = PartitionBuffer()
+    ds.partition = partition
+    ds.reference_data = worker_reference_data
+    if not ds.transform(worker_db_client, operations):
+        return None
+    return operations.results
+
+
+def merge_partition(
+    results: list[tuple[_WriteOp, Optional[dict], tuple[dict, ...]]],
+    operations: WriteBuffer,
+) -> int:
+    """Writes the results of a partition through a staging write buffer."""
+    count = 0
+    for op, key, lookup_keys in results:
+        if key is None:
+            operations.append(op)
+            count += 1
+        else:
+            count += operations.append_keyed(op, key, *lookup_keys)
+    return count
@@ -0,0 +1,83 @@
+import logging
+from typing import Optional
+
+from db.db_connection import DbConnection, Databases, ExtractionCollections
+from db.model.conference import Conference
+from db.model.venue import Venue
+
+log = logging.getLogger("CfbStats.etl")
+
+
+class ReferenceDataCache:
+    """
+    Conferences and venues of the staging, production and extraction DBs, loaded once
+    per ETL run so datasets can look them up without a query for every team and game.
+
+    Entities created during the run are not added here, they are found through the
+    pending entities of the write buffer. A lookup falls through to the extraction
+    entities when an entity is not loaded yet, and counts as a miss only if the
+    extraction entity is missing as well.
+    """
+
+    def __init__(self, db_client: DbConnection):
+        self.hits = 0
+        self.misses = 0
+
+        # Staging entities take precedence over production, like the DB lookups
+        self.conferences: dict[str, Conference] = {}
+        self.venues: dict[int, Venue] = {}
+        for db in (Databases.production, Databases.staging):
+            for conference in db_client.get_cfb_repository(db, Conference).find_by({}):
+                self.conferences[conference.name] = conference
+            for venue in db_client.get_cfb_repository(db, Venue).find_by({}):
+                self.venues[venue.venue_id] = venue
+
+        self.extr_conferences: dict[tuple[str, str], dict] = {
+            (extr_conference.get("name"), extr_conference.get("classification")): extr_conference
+            for extr_conference in db_client.get_cfb_collection(
+                Databases.extraction, ExtractionCollections.conference
+            ).find({}, {"_id": 0})
+        }
+        self.extr_venues: dict[int, dict] = {
+            extr_venue.get("id"): extr_venue
+            for extr_venue in db_client.get_cfb_collection(
+                Databases.extraction, ExtractionCollections.venue
+            ).find({}, {"_id": 0})
+        }
+
+        log.debug(
+            f"Reference data: loaded {len(self.conferences)} conferences, {len(self.venues)} venues, "
+            f"{len(self.extr_conferences)} extraction conferences and {len(self.extr_venues)} extraction venues"
+        )
+
+    def get_conference(self, name: str) -> Optional[Conference]:
+        return self.count(self.conferences.get(name), final=False)
+
+    def get_extraction_conference(self, name: str, classification: str) -> Optional[dict]:
+        return self.count(self.extr_conferences.get((name, classification)))
+
+    def get_venue(self, venue_id: int) -> Optional[Venue]:
+        return self.count(self.venues.get(venue_id), final=False)
+
+    def get_extraction_venue(self, venue_id: int) -> Optional[dict]:
+        return self.count(self.extr_venues.get(venue_id))
+
+    def count(self, entity, final: bool = True):
+        if entity is not None:
+            self.hits += 1
+        elif final:
+            self.misses += 1
+        return entity
+
+    def invalidate(self):
+        self.conferences.clear()
+        self.venues.clear()
+        self.extr_conferences.clear()
+        self.extr_venues.clear()
+
+    def log_stats(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups if lookups > 0 else 0.0
+        log.info(
+            f"Reference data: {lookups} lookups, {self.hits} hits ({hit_rate:.1%} hit rate)"
+        )
@@ -0,0 +1,96 @@
+import os
+import sys
+import logging
+import threading
+from typing import Any, Callable, Optional
+
+log = logging.getLogger("CfbStats")
+
+# Seconds between two RSS samples
+sample_interval = 0.05
+
+
+def get_rss() -> Optional[int]:
+    """Returns the current resident set size of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def get_peak_rss() -> Optional[int]:
+    """Returns the peak resident set size of this process since it started, in bytes."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, other platforms kilobytes
+    return peak_rss if sys.platform == "darwin" else peak_rss * 1024
+
+
+class MemoryMonitor:
+    """
+    Samples the RSS of the process in a background thread while a phase runs and logs
+    its peak. Where the current RSS cannot be read, the peak of the process so far is
+    logged instead, which only shows phases that raise it.
+    """
+
+    def __init__(self, name: str, level=logging.INFO, interval: float = sample_interval):
+        self.name = name
+        self.level = level
+        self.interval = interval
+        self.start_rss: Optional[int] = None
+        self.peak_rss: Optional[int] = None
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop_and_log()
+
+    def start(self):
+        self.stopped.clear()
+        self.start_rss = self.peak_rss = get_rss()
+        if self.start_rss is None:
+            return
+
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.update()
+
+    def update(self):
+        rss = get_rss()
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def stop(self) -> str:
+        self.stopped.set()
+        if self.thread is None:
+            peak_rss = get_peak_rss()
+            if peak_rss is None:
+                return f"{self.name}: RSS is not available on this platform"
+            return f"{self.name}: peak RSS of the process so far {peak_rss / (1024 * 1024):.1f} MB"
+
+        self.thread.join()
+        self.thread = None
+        self.update()
+        return (
+            f"{self.name}: peak RSS {self.peak_rss / (1024 * 1024):.1f} MB "
+            f"({(self.peak_rss - self.start_rss) / (1024 * 1024):+.1f} MB)"
+        )
+
+    def stop_and_log(self):
+        log.log(self.level, self.stop())
+
+    def run(self, func: Callable) -> Any:
+        with self:
+            return func()
@@ -0,0 +1,330 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+
+regular_weeks = 15
+quarters = 4
+
+
+class SyntheticCfbData:
+    """
+    Generates CFBD shaped data for a given number of seasons and teams. Every season is
+    generated from its own seed, so the same arguments always produce the same data and
+    seasons can be generated independently of each other.
+
+    Documents use the JSON field names of the CFBD API.
+    """
+
+    def __init__(
+        self,
+        seasons: int,
+        teams: int,
+        first_year: int = 2000,
+        classifications: tuple[str, ...] = ("fbs", "fcs"),
+        conference_size: int = 12,
+        seed: int = 0,
+    ):
+        if seasons < 1:
+            raise ValueError("At least one season must be generated")
+        if teams < 2 * len(classifications):
+            raise ValueError("Each classification needs at least two teams")
+
+        self.years = list(range(first_year, first_year + seasons))
+        self.team_count = teams
+        self.classifications = classifications
+        self.conference_size = conference_size
+        self.seed = seed
+
+        self.conferences = self.generate_conferences()
+        self.venues = self.generate_venues()
+        self.team_infos = self.generate_teams()
+
+    def generate_conferences(self) -> list[dict]:
+        conferences = []
+        teams_per_class = self.team_count // len(self.classifications)
+        for classification in self.classifications:
+            for x in range(math.ceil(teams_per_class / self.conference_size)):
+                conf_id = len(conferences) + 1
+                conferences.append(
+                    {
+                        "id": conf_id,
+                        "name": f"{classification.upper()} Conference {x + 1}",
+                        "shortName": f"{classification.upper()} {x + 1}",
+                        "abbreviation": f"{classification.upper()}{x + 1}",
+                        "classification": classification,
+                    }
+                )
+        return conferences
+
+    def generate_venues(self) -> list[dict]:
+        rand = random.Random(self.seed)
+        return [
+            {
+                "id": 1000 + x,
+                "name": f"Stadium {x + 1}",
+                "city": f"City {x + 1}",
+                "state": "ST",
+                "zip": f"{10000 + x}",
+                "countryCode": "US",
+                "timezone": "America/Chicago",
+                "latitude": round(rand.uniform(25, 48), 4),
+                "longitude": round(rand.uniform(-123, -70), 4),
+                "elevation": str(rand.randint(0, 2000)),
+                "capacity": rand.randint(10000, 100000),
+                "constructionYear": rand.randint(1900, 2020),
+                "grass": rand.random() < 0.4,
+                "dome": rand.random() < 0.1,
+            }
+            # One home stadium per team and a few neutral sites
+            for x in range(self.team_count + 10)
+        ]
+
+    def generate_teams(self) -> list[dict]:
+        teams = []
+        teams_per_class = self.team_count // len(self.classifications)
+        for class_index, classification in enumerate(self.classifications):
+            conferences = [
+                c for c in self.conferences if c["classification"] == classification
+            ]
+            count = (
+                teams_per_class
+                if class_index < len(self.classifications) - 1
+                else self.team_count - len(teams)
+            )
+            for x in range(count):
+                team_id = len(teams) + 1
+                teams.append(
+                    {
+                        "id": team_id,
+                        "school": f"School {team_id}",
+                        "mascot": f"Mascots {team_id}",
+                        "abbreviation": f"S{team_id}",
+                        "alternateNames": [f"School {team_id}", f"S{team_id}"],
+                        "conference": conferences[
+                            min(x // self.conference_size, len(conferences) - 1)
+                        ]["name"],
+                        "division": None,
+                        "classification": classification,
+                        "color": "#000000",
+                        "alternateColor": "#ffffff",
+                        "logos": [f"http://localhost/logos/{team_id}.png"],
+                        "twitter": f"@school{team_id}",
+                        "location": self.venues[team_id - 1],
+                    }
+                )
+        return teams
+
+    def get_teams(self, year: int) -> list[dict]:
+        if year not in self.years:
+            return []
+        return self.team_infos
+
+    @lru_cache(maxsize=64)
+    def get_season(self, year: int) -> tuple[list[dict], list[dict]]:
+        """Returns the games and game team stats of a season."""
+        if year not in self.years:
+            return [], []
+
+        rand = random.Random(f"{self.seed}-{year}")
+        games = []
+        game_stats = []
+
+        season_start = datetime(year, 8, 30, 18, tzinfo=timezone.utc)
+        for classification in self.classifications:
+            teams = [t for t in self.team_infos if t["classification"] == classification]
+
+            weeks = [(week, "regular") for week in range(1, regular_weeks + 1)]
+            weeks.append((1, "postseason"))
+            for week, season_type in weeks:
+                week_teams = list(teams)
+                rand.shuffle(week_teams)
+                if season_type == "postseason":
+                    # Bowl games for half of the teams
+                    week_teams = week_teams[: len(week_teams) // 2]
+
+                start_date = season_start + timedelta(
+                    weeks=week - 1 if season_type == "regular" else regular_weeks + 2
+                )
+                for home, away in zip(week_teams[0::2], week_teams[1::2]):
+                    game_id = (year * 100000) + len(games) + 1
+                    game, stats = self.generate_game(
+                        rand, game_id, year, week, season_type, start_date, home, away
+                    )
+                    games.append(game)
+                    game_stats.append(stats)
+
+        return games, game_stats
+
+    def get_games(self, year: int) -> list[dict]:
+        return self.get_season(year)[0]
+
+    def get_game_team_stats(self, year: int) -> list[dict]:
+        return self.get_season(year)[1]
+
+    def generate_game(
+        self,
+        rand: random.Random,
+        game_id: int,
+        year: int,
+        week: int,
+        season_type: str,
+        start_date: datetime,
+        home: dict,
+        away: dict,
+    ) -> tuple[dict, dict]:
+        neutral_site = season_type == "postseason"
+        venue = (
+            self.venues[self.team_count + rand.randrange(10)]
+            if neutral_site
+            else home["location"]
+        )
+
+        home_line_scores = self.generate_line_scores(rand, 27 + (0 if neutral_site else 3))
+        away_line_scores = self.generate_line_scores(rand, 27)
+        home_points = sum(home_line_scores)
+        away_points = sum(away_line_scores)
+
+        # No ties, break them in an extra period
+        if home_points == away_points:
+            home_line_scores.append(7)
+            away_line_scores.append(0)
+            home_points += 7
+
+        game = {
+            "id": game_id,
+            "season": year,
+            "week": week,
+            "seasonType": season_type,
+            "startDate": start_date.isoformat().replace("+00:00", "Z"),
+            "startTimeTBD": False,
+            "completed": True,
+            "neutralSite": neutral_site,
+            "conferenceGame": home["conference"] == away["conference"],
+            "attendance": int(venue["capacity"] * rand.uniform(0.5, 1.0)),
+            "venueId": venue["id"],
+            "venue": venue["name"],
+            "homeId": home["id"],
+            "homeTeam": home["school"],
+            "homeConference": home["conference"],
+            "homeClassification": home["classification"],
+            "homePoints": home_points,
+            "homeLineScores": home_line_scores,
+            "homePostgameWinProbability": round(rand.random(), 4),
+            "homePregameElo": rand.randint(1000, 2000),
+            "homePostgameElo": rand.randint(1000, 2000),
+            "awayId": away["id"],
+            "awayTeam": away["school"],
+            "awayConference": away["conference"],
+            "awayClassification": away["classification"],
+            "awayPoints": away_points,
+            "awayLineScores": away_line_scores,
+            "awayPostgameWinProbability": round(rand.random(), 4),
+            "awayPregameElo": rand.randint(1000, 2000),
+            "awayPostgameElo": rand.randint(1000, 2000),
+            "excitementIndex": round(rand.uniform(0, 10), 2),
+            "highlights": None,
+            "notes": None,
+        }
+
+        home_possession = rand.randint(24 * 60, 36 * 60)
+        stats = {
+            "id": game_id,
+            "teams": [
+                self.generate_team_stats(rand, home, "home", home_points, home_possession),
+                self.generate_team_stats(
+                    rand, away, "away", away_points, 60 * 60 - home_possession
+                ),
+            ],
+        }
+
+        return game, stats
+
+    def generate_line_scores(self, rand: random.Random, mean_points: float) -> list[int]:
+        scores = []
+        for x in range(quarters):
+            touchdowns = poisson(rand, mean_points / quarters / 9)
+            field_goals = poisson(rand, mean_points / quarters / 12)
+            scores.append(touchdowns * 7 + field_goals * 3)
+        return scores
+
+    def generate_team_stats(
+        self,
+        rand: random.Random,
+        team: dict,
+        home_away: str,
+        points: int,
+        possession_seconds: int,
+    ) -> dict:
+        rushing_attempts = max(int(rand.gauss(38, 7)), 10)
+        rushing_yards = int(rushing_attempts * rand.gauss(4.5, 1.2))
+        passing_attempts = max(int(rand.gauss(32, 8)), 5)
+        completions = sum(rand.random() < 0.62 for x in range(passing_attempts))
+        passing_yards = int(completions * max(rand.gauss(11.5, 2), 0))
+        third_down_attempts = rand.randint(8, 18)
+        fourth_down_attempts = rand.randint(0, 4)
+        fumbles = poisson(rand, 1.5)
+        fumbles_lost = sum(rand.random() < 0.5 for x in range(fumbles))
+        interceptions = poisson(rand, 0.8)
+        penalties = poisson(rand, 6)
+
+        stats = {
+            "rushingTDs": poisson(rand, 1.6),
+            "passingTDs": poisson(rand, 1.8),
+            "kickReturnYards": rand.randint(0, 150),
+            "kickReturnTDs": int(rand.random() < 0.03),
+            "kickReturns": rand.randint(0, 6),
+            "kickingPoints": poisson(rand, 6),
+            "fumblesRecovered": poisson(rand, 0.7),
+            "totalFumbles": fumbles,
+            "tacklesForLoss": poisson(rand, 5),
+            "defensiveTDs": int(rand.random() < 0.1),
+            "tackles": rand.randint(40, 80),
+            "sacks": poisson(rand, 2),
+            "qbHurries": poisson(rand, 4),
+            "passesDeflected": poisson(rand, 4),
+            "interceptionYards": interceptions * rand.randint(0, 30),
+            "interceptionTDs": int(rand.random() < 0.05),
+            "passesIntercepted": poisson(rand, 0.8),
+            "firstDowns": rand.randint(10, 30),
+            "thirdDownEff": f"{rand.randint(0, third_down_attempts)}-{third_down_attempts}",
+            "fourthDownEff": f"{rand.randint(0, fourth_down_attempts)}-{fourth_down_attempts}",
+            "totalYards": rushing_yards + passing_yards,
+            "netPassingYards": passing_yards,
+            "completionAttempts": f"{completions}-{passing_attempts}",
+            "yardsPerPass": round(passing_yards / passing_attempts, 1),
+            "rushingYards": rushing_yards,
+            "rushingAttempts": rushing_attempts,
+            "yardsPerRushAttempt": round(rushing_yards / rushing_attempts, 1),
+            "totalPenaltiesYards": f"{penalties}-{penalties * rand.randint(5, 10)}",
+            "turnovers": fumbles_lost + interceptions,
+            "fumblesLost": fumbles_lost,
+            "interceptions": interceptions,
+            "possessionTime": f"{possession_seconds // 60}:{possession_seconds % 60:02d}",
+            "puntReturns": rand.randint(0, 5),
+            "puntReturnYards": rand.randint(0, 80),
+            "puntReturnTDs": int(rand.random() < 0.02),
+        }
+
+        return {
+            "teamId": team["id"],
+            "team": team["school"],
+            "conference": team["conference"],
+            "homeAway": home_away,
+            "points": points,
+            "stats": [
+                {"category": category, "stat": str(stat)}
+                for category, stat in stats.items()
+            ],
+        }
+
+
+def poisson(rand: random.Random, mean: float) -> int:
+    """Draws from a Poisson distribution using Knuth's algorithm."""
+    limit = math.exp(-mean)
+    count = 0
+    product = rand.random()
+    while product > limit:
+        count += 1
+        product *= rand.random()
+    return count
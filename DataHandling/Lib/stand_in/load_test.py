@@ -0,0 +1,106 @@
+import logging
+import argparse
+import threading
+from typing import Optional
+
+from db.db_cleanup import *
+from etl.etls.etl import LoadMode, TransformMode
+from etl.etls.etl_init import EtlInit
+from stand_in.data_generator import SyntheticCfbData
+from stand_in.server import StandInServer
+from timer import Timer
+
+log = logging.getLogger("CfbStats.stand_in")
+
+
+def run_load_test(
+    seasons: list[int],
+    teams: int,
+    latency: float = 0.0,
+    error_rate: float = 0.0,
+    first_year: int = 2000,
+    transform_workers: int = 1,
+    transform_mode: TransformMode = TransformMode.python,
+    load_mode: LoadMode = LoadMode.entities,
+    load_chunk_size: Optional[int] = None,
+) -> dict[int, float]:
+    """
+    Runs the initial ETL against the stand-in server once for every season count and
+    returns the run times. Every run starts from empty test databases.
+    """
+    results = {}
+    for season_count in seasons:
+        data = SyntheticCfbData(season_count, teams, first_year=first_year)
+        server = StandInServer(data, port=0, latency=latency, error_rate=error_rate)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+
+        try:
+            with DbConnection(True) as db_client:
+                cleanup_extraction_collections(db_client)
+                cleanup_staging_collections(db_client)
+                cleanup_production_collections(db_client)
+
+            timer = Timer(f"{season_count} seasons of {teams} teams")
+            EtlInit(
+                years=data.years,
+                test_mode=True,
+                use_cache=False,
+                incremental=False,
+                cfbd_host=server.host,
+                transform_workers=transform_workers,
+                transform_mode=transform_mode,
+                load_mode=load_mode,
+                load_chunk_size=load_chunk_size,
+            ).run_etl()
+            timer.stop_and_log(logging.INFO)
+            results[season_count] = timer.get_elapsed_time()
+
+            log.info(
+                f"Stand-in served {server.requests} requests, {server.errors} injected errors"
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    for season_count, elapsed_time in results.items():
+        log.info(
+            f"{season_count} seasons: {elapsed_time:.2f} seconds, "
+            f"{elapsed_time / season_count:.2f} seconds per season"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    import logging_config
+
+    parser = argparse.ArgumentParser(description="Measures ETL scaling with data volume")
+    parser.add_argument("--seasons", type=int, nargs="+", default=[1, 3, 10])
+    parser.add_argument("--teams", type=int, default=260)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--transform-workers", type=int, default=1)
+    parser.add_argument(
+        "--transform-mode",
+        choices=[mode.value for mode in TransformMode],
+        default=TransformMode.python.value,
+    )
+    parser.add_argument(
+        "--load-mode",
+        choices=[mode.value for mode in LoadMode],
+        default=LoadMode.entities.value,
+    )
+    parser.add_argument("--load-chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    run_load_test(
+        args.seasons,
+        args.teams,
+        args.latency,
+        args.error_rate,
+        transform_workers=args.transform_workers,
+        transform_mode=TransformMode(args.transform_mode),
+        load_mode=LoadMode(args.load_mode),
+        load_chunk_size=args.load_chunk_size,
+    )
+    logging.shutdown()
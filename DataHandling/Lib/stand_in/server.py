@@ -0,0 +1,189 @@
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from stand_in.data_generator import SyntheticCfbData
+
+log = logging.getLogger("CfbStats.stand_in")
+
+default_port = 8089
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Local stand-in for the CFBD API endpoints used by the extraction datasets, serving
+    synthetic data. Every request can be delayed by 'latency' seconds (plus up to
+    'jitter' seconds) and fails with a retryable status with a probability of
+    'error_rate'. Requests are handled in threads, so the random generator and the
+    counters are shared under 'lock'.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        data: SyntheticCfbData,
+        port: int = default_port,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        super().__init__(("127.0.0.1", port), StandInHandler)
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+
+    @property
+    def host(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    server: StandInServer
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[0] for k, v in parse_qs(url.query).items()}
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            delay = server.latency + server.random.uniform(0, server.jitter)
+            error_status = None
+            if server.random.random() < server.error_rate:
+                server.errors += 1
+                error_status = 429 if server.random.random() < 0.5 else 503
+
+        if delay > 0:
+            time.sleep(delay)
+
+        if error_status == 429:
+            self.send_json(429, {"message": "Too many requests"}, {"Retry-After": "1"})
+            return
+        if error_status == 503:
+            self.send_json(503, {"message": "Service unavailable"})
+            return
+
+        routes = {
+            "/games": self.get_games,
+            "/games/teams": self.get_game_team_stats,
+            "/teams": self.get_teams,
+            "/teams/fbs": self.get_fbs_teams,
+            "/conferences": self.get_conferences,
+            "/venues": self.get_venues,
+        }
+        route = routes.get(url.path.rstrip("/"))
+        if route is None:
+            self.send_json(404, {"message": f"Unknown endpoint {url.path}"})
+            return
+
+        try:
+            self.send_json(200, route(params))
+        except (KeyError, ValueError) as e:
+            self.send_json(400, {"message": f"Invalid parameters: {e}"})
+
+    def get_games(self, params: dict) -> list[dict]:
+        games = self.server.data.get_games(int(params["year"]))
+        return [
+            g
+            for g in games
+            if matches(g, params, "week", "week", int)
+            and matches(g, params, "seasonType", "seasonType")
+            and matches(g, params, "id", "id", int)
+            and (
+                "classification" not in params
+                or params["classification"]
+                in (g["homeClassification"], g["awayClassification"])
+            )
+            and ("team" not in params or params["team"] in (g["homeTeam"], g["awayTeam"]))
+            and (
+                "conference" not in params
+                or params["conference"] in (g["homeConference"], g["awayConference"])
+            )
+        ]
+
+    def get_game_team_stats(self, params: dict) -> list[dict]:
+        data = self.server.data
+        year = int(params["year"])
+        game_ids = {g["id"] for g in self.get_games(params)}
+        return [s for s in data.get_game_team_stats(year) if s["id"] in game_ids]
+
+    def get_teams(self, params: dict) -> list[dict]:
+        data = self.server.data
+        teams = data.get_teams(int(params["year"])) if "year" in params else data.team_infos
+        return [t for t in teams if matches(t, params, "conference", "conference")]
+
+    def get_fbs_teams(self, params: dict) -> list[dict]:
+        return [t for t in self.get_teams(params) if t["classification"] == "fbs"]
+
+    def get_conferences(self, params: dict) -> list[dict]:
+        return self.server.data.conferences
+
+    def get_venues(self, params: dict) -> list[dict]:
+        return self.server.data.venues
+
+    def send_json(self, status: int, body, headers: dict = {}):
+        content = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} {format % args}")
+
+
+def matches(doc: dict, params: dict, param: str, field: str, cast=str) -> bool:
+    return param not in params or doc[field] == cast(params[param])
+
+
+def main():
+    import logging_config
+
+    parser = argparse.ArgumentParser(description="Local stand-in for the CFBD API")
+    parser.add_argument("--seasons", type=int, default=3)
+    parser.add_argument("--teams", type=int, default=260)
+    parser.add_argument("--first-year", type=int, default=2000)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    data = SyntheticCfbData(
+        args.seasons, args.teams, first_year=args.first_year, seed=args.seed
+    )
+    server = StandInServer(
+        data,
+        port=args.port,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+
+    log.info(f"Serving {args.seasons} synthetic seasons on {server.host}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -7,34 +7,36 @@ from etl.etls.etl_init import EtlInit
 from etl.etls.etl_season_start import EtlSeasonStart
 from etl.etls.etl_weekly_results import EtlWeeklyResults
 
-with DbConnection(True) as db_client:
-    cleanup_extraction_collections(db_client)
-    cleanup_staging_collections(db_client)
-    cleanup_production_collections(db_client)
+# Transform worker processes import this module, so the ETL only runs as a script
+if __name__ == "__main__":
+    with DbConnection(True) as db_client:
+        cleanup_extraction_collections(db_client)
+        cleanup_staging_collections(db_client)
+        cleanup_production_collections(db_client)
 
-EtlInit(
-    years=[2025],
-    skip_extract=False,
-    clean_extract=True,
-    clean_staging=True,
-    test_mode=True,
-).run_etl()
+    EtlInit(
+        years=[2025],
+        skip_extract=False,
+        clean_extract=True,
+        clean_staging=True,
+        test_mode=True,
+    ).run_etl()
 
-# EtlSeasonStart(
-#     years=[2024],
-#     test_mode=True,
-#     clean_extract=False,
-#     clean_staging=False,
-# ).run_etl()
+    # EtlSeasonStart(
+    #     years=[2024],
+    #     test_mode=True,
+    #     clean_extract=False,
+    #     clean_staging=False,
+    # ).run_etl()
 
-# EtlWeeklyResults(
-#     year=2024,
-#     week=1,
-#     season_type=SeasonType.REGULAR,
-#     test_mode=True,
-#     clean_extract=False,
-#     clean_staging=False,
-#     # skip_extract=True,
-# ).run_etl()
+    # EtlWeeklyResults(
+    #     year=2024,
+    #     week=1,
+    #     season_type=SeasonType.REGULAR,
+    #     test_mode=True,
+    #     clean_extract=False,
+    #     clean_staging=False,
+    #     # skip_extract=True,
+    # ).run_etl()
 
-logging.shutdown()
+    logging.shutdown()
@@ -0,0 +1,68 @@
+import threading
+import unittest
+
+from db.db_cleanup import *
+from db.db_index_setup import staging_indexes
+from etl.etls.etl import TransformMode
+from etl.etls.etl_init import EtlInit
+from stand_in.data_generator import SyntheticCfbData
+from stand_in.server import StandInServer
+
+
+class AggregationTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = SyntheticCfbData(1, 24)
+        cls.server = StandInServer(cls.data, port=0)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        with DbConnection(True) as client:
+            cleanup_staging_collections(client)
+            cleanup_production_collections(client)
+
+    def get_staging(self, transform_mode: TransformMode) -> dict[str, list[dict]]:
+        """Runs the initial ETL in a transform mode and returns the staged documents."""
+        with DbConnection(True) as client:
+            cleanup_extraction_collections(client)
+            cleanup_staging_collections(client)
+            cleanup_production_collections(client)
+
+        EtlInit(
+            years=self.data.years,
+            test_mode=True,
+            clean_staging=False,
+            use_cache=False,
+            incremental=False,
+            cfbd_host=self.server.host,
+            transform_mode=transform_mode,
+        ).run_etl()
+
+        staging = {}
+        with DbConnection(True) as client:
+            for model in staging_indexes:
+                docs = client.get_cfb_collection(Databases.staging, model).find(
+                    {}, {"_id": 0}
+                )
+                staging[model.model_id()] = sorted(
+                    docs, key=lambda doc: tuple(doc[key] for key in model.model_keys())
+                )
+        return staging
+
+    def test_aggregation_staging_parity(self):
+        python_staging = self.get_staging(TransformMode.python)
+        aggregation_staging = self.get_staging(TransformMode.aggregation)
+
+        for model_id, docs in python_staging.items():
+            self.assertGreater(
+                len(docs), 0, f"Test failed: test_aggregation_staging_parity - {model_id} not staged"
+            )
+            self.assertEqual(
+                docs,
+                aggregation_staging[model_id],
+                f"Test failed: test_aggregation_staging_parity - {model_id}",
+            )
@@ -0,0 +1,74 @@
+import unittest
+
+from db.db_cleanup import *
+from db.db_utility import WriteBuffer
+from db.model.conference import Conference
+from db.model.team import Team
+from db.model.venue import Venue
+from etl.datasets.team_dataset import TeamDataset
+from etl.reference_data import ReferenceDataCache
+from stand_in.data_generator import SyntheticCfbData
+
+
+class DatasetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = SyntheticCfbData(1, 4)
+        self.year = self.data.years[0]
+        self.client = DbConnection(True)
+        cleanup_extraction_collections(self.client)
+        cleanup_staging_collections(self.client)
+        cleanup_production_collections(self.client)
+
+        extraction = {
+            ExtractionCollections.conference: self.data.conferences,
+            ExtractionCollections.venue: self.data.venues,
+            ExtractionCollections.team: [
+                {**team, "year": self.year} for team in self.data.get_teams(self.year)
+            ],
+        }
+        for coll, docs in extraction.items():
+            self.client.get_cfb_collection(Databases.extraction, coll).insert_many(
+                [dict(doc) for doc in docs]
+            )
+
+    def tearDown(self):
+        cleanup_extraction_collections(self.client)
+        cleanup_staging_collections(self.client)
+        self.client.close()
+
+    def transform_teams(self, reference_data=None) -> bool:
+        ds = TeamDataset(years=[self.year], classifications=list(self.data.classifications))
+        ds.reference_data = reference_data
+        with WriteBuffer(self.client) as operations:
+            return ds.transform(self.client, operations)
+
+    def assert_staged_teams(self):
+        teams = self.data.get_teams(self.year)
+        counts = {
+            Team: len(teams),
+            Conference: len({team["conference"] for team in teams}),
+            Venue: len({team["location"]["id"] for team in teams}),
+        }
+        for model, count in counts.items():
+            coll = self.client.get_cfb_collection(Databases.staging, model)
+            self.assertEqual(
+                coll.count_documents({}),
+                count,
+                f"Test failed: assert_staged_teams - {model.__name__}",
+            )
+
+    def test_transform_creates_references(self):
+        self.assertTrue(self.transform_teams(), "Test failed: test_transform_creates_references")
+        self.assert_staged_teams()
+
+    def test_transform_creates_references_from_reference_data(self):
+        reference_data = ReferenceDataCache(self.client)
+        try:
+            self.assertTrue(
+                self.transform_teams(reference_data),
+                "Test failed: test_transform_creates_references_from_reference_data",
+            )
+        finally:
+            reference_data.invalidate()
+        self.assert_staged_teams()
@@ -0,0 +1,115 @@
+import unittest
+from bson import ObjectId
+
+from db.db_connection import DbConnection, Databases
+from db.db_utility import fingerprint_field, get_fingerprint
+from db.model.venue import Venue
+from etl.etls.etl import LoadMode
+from etl.etls.etl_init import EtlInit
+
+
+def get_venue_doc(venue_id: int, name: str = "Stadium") -> dict:
+    """Returns a staged venue document."""
+    return {
+        "_id": ObjectId(),
+        "venue_id": venue_id,
+        "name": name,
+        "city": "Austin",
+        "state": "TX",
+        "zip": "78712",
+        "country_code": "US",
+        "timezone": "America/Chicago",
+        "latitude": 30.28,
+        "longitude": -97.73,
+        "elevation": "150",
+        "capacity": 100000,
+        "construction_year": 1924,
+        "grass": True,
+        "dome": False,
+    }
+
+
+class LoadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.client = DbConnection(True)
+        self.prod_coll = self.client.get_cfb_collection(Databases.production, Venue)
+        self.prod_coll.delete_many({})
+        self.etl = EtlInit(test_mode=True)
+
+    def tearDown(self):
+        self.prod_coll.delete_many({})
+        self.client.close()
+
+    def insert_production_venue(self, doc: dict):
+        doc = {key: value for key, value in doc.items() if key != "_id"}
+        self.prod_coll.insert_one({**doc, fingerprint_field: get_fingerprint(doc)})
+
+    def test_fingerprint_ignores_ids(self):
+        doc = get_venue_doc(1)
+        fingerprint = get_fingerprint(doc)
+
+        self.assertEqual(fingerprint, get_fingerprint({**doc, "_id": ObjectId()}))
+        self.assertEqual(fingerprint, get_fingerprint({**doc, "id": ObjectId()}))
+        self.assertEqual(fingerprint, get_fingerprint({**doc, fingerprint_field: b""}))
+        self.assertNotEqual(fingerprint, get_fingerprint({**doc, "name": "Field"}))
+
+    def test_fingerprint_load_modes(self):
+        doc = get_venue_doc(1)
+        fingerprints = {}
+        for mode in (LoadMode.raw, LoadMode.entities):
+            self.etl.load_mode = mode
+            op = self.etl.get_load_operation(
+                self.client, Venue, dict(doc), do_replace=True
+            )
+            fingerprints[mode] = op._doc[fingerprint_field]
+
+        self.assertEqual(fingerprints[LoadMode.raw], fingerprints[LoadMode.entities])
+
+    def test_replace_skips_unchanged(self):
+        unchanged = get_venue_doc(1)
+        changed = get_venue_doc(2)
+        self.insert_production_venue(unchanged)
+        self.insert_production_venue(changed)
+
+        changed = {**changed, "name": "Renamed Stadium"}
+        for mode in (LoadMode.raw, LoadMode.entities):
+            self.etl.load_mode = mode
+            self.etl.unchanged_writes = 0
+            ops = list(
+                self.etl.generate_replace_operations(
+                    self.client, Venue, [dict(unchanged), dict(changed)]
+                )
+            )
+
+            self.assertEqual([doc_id for doc_id, _ in ops], [changed["_id"]])
+            self.assertEqual(ops[0][1]._doc["name"], "Renamed Stadium")
+            self.assertEqual(self.etl.unchanged_writes, 1)
+
+    def test_replace_skips_unchanged_without_fingerprint(self):
+        unchanged = get_venue_doc(1)
+        self.prod_coll.insert_one(
+            {key: value for key, value in unchanged.items() if key != "_id"}
+        )
+
+        self.etl.load_mode = LoadMode.entities
+        ops = list(
+            self.etl.generate_replace_operations(self.client, Venue, [dict(unchanged)])
+        )
+
+        self.assertEqual(ops, [])
+        self.assertEqual(self.etl.unchanged_writes, 1)
+
+    def test_missing_drops_duplicate_keys(self):
+        existing = get_venue_doc(1)
+        self.insert_production_venue(existing)
+
+        first = get_venue_doc(2)
+        duplicate = get_venue_doc(2, name="Duplicate")
+        ops = list(
+            self.etl.generate_missing_operations(
+                self.client, Venue, [dict(existing), dict(first), dict(duplicate)]
+            )
+        )
+
+        self.assertEqual([doc_id for doc_id, _ in ops], [first["_id"]])